@@ -0,0 +1,27 @@
+import itertools
+from conftest import generate_segments, rounds_for, peak_memory
+from src.trapezoidal_map import TrapezoidalMap
+
+
+def build(trapezoidal_map: TrapezoidalMap) -> TrapezoidalMap:
+    trapezoidal_map.build_trapezoidal_map()
+    return trapezoidal_map
+
+
+def bench_build(benchmark, distribution, size):
+    segments = generate_segments(distribution, size)
+    seeds = itertools.count()
+
+    trapezoidal_map = benchmark.pedantic(build, setup=lambda: ((TrapezoidalMap(segments, seed=next(seeds)),), {}),
+                                         rounds=rounds_for(size))
+
+    stats = trapezoidal_map.stats()
+    benchmark.extra_info.update({
+        'segments': len(segments),
+        'nodes': stats['nodes'],
+        'trapezoids': stats['leaves'],
+        'max_depth': stats['max_depth'],
+        'mean_depth': stats['mean_depth'],
+        'memory_bytes': stats['memory_bytes'],
+        'peak_memory_bytes': peak_memory(segments),
+    })
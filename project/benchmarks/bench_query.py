@@ -0,0 +1,24 @@
+from src.query_profiler import QueryProfiler
+
+
+def bench_locate(benchmark, built_map, query_points, engine):
+    if engine == 'python':
+        locate = built_map.tree.locate
+        points = query_points.tolist()
+        benchmark.pedantic(lambda: [locate(x, y) for x, y in points], rounds=3)
+    else:
+        compiled = built_map.compile()
+        benchmark.pedantic(compiled.locate_many, args=(query_points,), rounds=5)
+
+    profiler = QueryProfiler()
+    built_map.set_profiler(profiler)
+    built_map.compile().locate_many(query_points)
+    built_map.set_profiler(None)
+    summary = profiler.summary()
+    benchmark.extra_info.update({
+        'queries': len(query_points),
+        'mean_comparisons': summary['mean_x_comparisons'] + summary['mean_y_comparisons'],
+        'max_comparisons': summary['max_path_length'],
+    })
+    if benchmark.stats is not None:
+        benchmark.extra_info['queries_per_second'] = len(query_points) / benchmark.stats.stats.mean
@@ -0,0 +1,96 @@
+import tracemalloc
+import numpy as np
+import pytest
+from src import utils
+from src.trapezoidal_map import TrapezoidalMap
+
+DISTRIBUTIONS = {
+    'parallel': utils.generateParallelSegments,
+    'random': utils.generateRandomSegments,
+    'grid_mesh': utils.generateGridMesh,
+    'triangle_mesh': utils.generateTriangleMesh,
+    'hex_mesh': utils.generateHexMesh,
+    'near_vertical': utils.generateNearVerticalSegments,
+}
+POINT_DISTRIBUTIONS = {
+    'uniform': utils.generateUniformPoints,
+    'clustered': utils.generateClusteredPoints,
+    'skewed': utils.generateSkewedPoints,
+}
+MAX_COORDINATE = 10 ** 6
+
+
+def pytest_addoption(parser):
+    parser.addoption('--sizes', default='100,1000,10000,100000',
+                     help='comma-separated numbers of segments, up to 1000000')
+    parser.addoption('--distributions', default=','.join(DISTRIBUTIONS),
+                     help='comma-separated input distributions: ' + ', '.join(DISTRIBUTIONS))
+    parser.addoption('--queries', type=int, default=100000, help='number of query points per benchmark')
+    parser.addoption('--point-distributions', default='uniform',
+                     help='comma-separated query point distributions: ' + ', '.join(POINT_DISTRIBUTIONS))
+
+
+def pytest_configure(config):
+    for option, choices in (('distributions', DISTRIBUTIONS), ('point_distributions', POINT_DISTRIBUTIONS)):
+        unknown = [name for name in config.getoption(option).split(',') if name not in choices]
+        if unknown:
+            raise pytest.UsageError(f"unknown --{option.replace('_', '-')}: {', '.join(unknown)} "
+                                    f"(choose from {', '.join(choices)})")
+
+
+def pytest_generate_tests(metafunc):
+    config = metafunc.config
+    if 'distribution' in metafunc.fixturenames:
+        metafunc.parametrize('distribution', config.getoption('distributions').split(','))
+    if 'size' in metafunc.fixturenames:
+        metafunc.parametrize('size', [int(float(size)) for size in config.getoption('sizes').split(',')])
+    if 'point_distribution' in metafunc.fixturenames:
+        metafunc.parametrize('point_distribution', config.getoption('point_distributions').split(','))
+    if 'engine' in metafunc.fixturenames:
+        metafunc.parametrize('engine', ['python', 'compiled'])
+
+
+def generate_segments(distribution: str, size: int) -> list:
+    np.random.seed(size)
+    return DISTRIBUTIONS[distribution](MAX_COORDINATE, MAX_COORDINATE, size)
+
+
+def rounds_for(size: int) -> int:
+    return max(1, min(10, 10 ** 5 // size))
+
+
+def peak_memory(segments: list) -> int:
+    tracemalloc.start()
+    try:
+        TrapezoidalMap(segments, seed=0).build_trapezoidal_map()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.fixture(scope='session')
+def map_cache() -> dict:
+    return {}
+
+
+@pytest.fixture
+def built_map(map_cache, distribution, size) -> TrapezoidalMap:
+    key = (distribution, size)
+    if key not in map_cache:
+        map_cache.clear()
+        trapezoidal_map = TrapezoidalMap(generate_segments(distribution, size), seed=0)
+        trapezoidal_map.build_trapezoidal_map()
+        trapezoidal_map.get_trapezoids()
+        map_cache[key] = trapezoidal_map
+
+    return map_cache[key]
+
+
+@pytest.fixture
+def query_points(request, built_map, point_distribution) -> np.ndarray:
+    np.random.seed(0)
+    generate = POINT_DISTRIBUTIONS[point_distribution]
+    points = generate(MAX_COORDINATE, MAX_COORDINATE, request.config.getoption('queries'))
+    low = np.array(built_map.rect_bound.left.to_tuple())
+    high = np.array(built_map.rect_bound.right.to_tuple())
+    return low + np.array(points) / MAX_COORDINATE * (high - low)
@@ -0,0 +1,118 @@
+import argparse
+import itertools
+import struct
+import numpy as np
+from src.compiled_tree import CompiledTree
+from src.query_server import QueryServer
+from src.trapezoidal_map import TrapezoidalMap
+
+
+def read_chunks(path: str, chunk_size: int, columns: int, skip_header: bool = False):
+    if path.endswith('.npy'):
+        data = np.load(path, mmap_mode='r')
+        data = data.reshape(len(data), columns)
+        for i in range(0, len(data), chunk_size):
+            yield np.asarray(data[i:i + chunk_size], dtype=np.float64)
+        return
+
+    with open(path) as f:
+        if skip_header:
+            next(f, None)
+        while True:
+            lines = list(itertools.islice(f, chunk_size))
+            if not lines:
+                return
+            yield np.loadtxt(lines, delimiter=',', dtype=np.float64, ndmin=2).reshape(-1, columns)
+
+
+class NpyWriter:
+    HEADER_SIZE = 128
+
+    def __init__(self, path: str, dtype: np.dtype):
+        self.file = open(path, 'wb')
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        self.__write_header()
+
+    def __write_header(self):
+        header = f"{{'descr': '{self.dtype.str}', 'fortran_order': False, 'shape': ({self.count},), }}"
+        header = header.ljust(NpyWriter.HEADER_SIZE - 11) + '\n'
+        self.file.seek(0)
+        self.file.write(b'\x93NUMPY\x01\x00')
+        self.file.write(struct.pack('<H', len(header)))
+        self.file.write(header.encode('latin1'))
+
+    def write(self, values: np.ndarray):
+        self.file.write(np.ascontiguousarray(values, dtype=self.dtype).tobytes())
+        self.count += len(values)
+
+    def close(self):
+        self.__write_header()
+        self.file.close()
+
+
+class CsvWriter:
+    def __init__(self, path: str):
+        self.file = open(path, 'w')
+
+    def write(self, values: np.ndarray):
+        np.savetxt(self.file, values, fmt='%d')
+
+    def close(self):
+        self.file.close()
+
+
+def load_map(args) -> CompiledTree:
+    if args.map is not None:
+        return CompiledTree.load(args.map)
+
+    columns = 6 if args.regions else 4
+    segments = np.concatenate(list(read_chunks(args.segments, args.chunk_size, columns, args.skip_header)))
+    labels = None
+    if args.regions:
+        labels = [tuple(None if label < 0 else label for label in row) for row in segments[:, 4:].astype(int).tolist()]
+    trapezoidal_map = TrapezoidalMap(segments[:, :4].reshape(-1, 2, 2).tolist(), labels)
+    trapezoidal_map.build_trapezoidal_map()
+    if args.save_map is not None:
+        trapezoidal_map.save(args.save_map)
+
+    return trapezoidal_map.compile()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Locate query points in a trapezoidal map.')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--segments', help='CSV (x1,y1,x2,y2 per row) or .npy file with the input segments')
+    source.add_argument('--map', help='map file written by TrapezoidalMap.save or --save-map')
+    parser.add_argument('--save-map', help='write the built map to this file')
+    parser.add_argument('--chunk-size', type=int, default=100000, help='number of rows read at once')
+    parser.add_argument('--processes', type=int, default=1, help='number of query worker processes')
+    parser.add_argument('--skip-header', action='store_true', help='skip the first line of CSV inputs')
+    parser.add_argument('--regions', action='store_true',
+                        help='write region ids instead of trapezoid ids; segment rows then carry two more columns '
+                             'with the region above and below the segment (-1 for none)')
+    parser.add_argument('points', help='CSV (x,y per row) or .npy file with the query points')
+    parser.add_argument('output', help='output file, .npy or one id per line')
+    args = parser.parse_args(argv)
+
+    if args.processes > 1 and args.map is None and args.save_map is None:
+        parser.error('--processes needs --map or --save-map')
+
+    tree = load_map(args)
+    writer = NpyWriter(args.output, np.int64) if args.output.endswith('.npy') else CsvWriter(args.output)
+    chunks = read_chunks(args.points, args.chunk_size, 2, args.skip_header)
+    try:
+        if args.processes > 1:
+            with QueryServer(args.map or args.save_map, args.processes) as server:
+                for ids in server.imap(chunks, args.regions):
+                    writer.write(ids)
+        else:
+            locate = tree.locate_regions if args.regions else tree.locate_many
+            for chunk in chunks:
+                writer.write(locate(chunk))
+    finally:
+        writer.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+from __future__ import annotations
+import mmap
+import struct
+import time
+import numpy as np
+from typing import TYPE_CHECKING
+from .data_structures import DTree, Point, Trapezoid, X_NODE, LEAF, ERROR_BOUND
+
+if TYPE_CHECKING:
+    from .query_profiler import QueryProfiler
+
+
+class CompiledTree:
+    MAGIC = b'TRAPMAP\0'
+    VERSION = 4
+    FIELDS = ('kind', 'x', 'y', 'end_x', 'end_y', 'left', 'right', 'trapezoid', 'segments', 'trapezoid_points',
+              'trapezoid_segments', 'region', 'bbox')
+    NO_REGION = -1
+    OUTSIDE = -1
+    HEADER = struct.Struct('<8sII')
+    FIELD = struct.Struct('<32s8sQQQ')
+    ALIGNMENT = 64
+
+    def __init__(self, kind: np.ndarray, x: np.ndarray, y: np.ndarray, end_x: np.ndarray, end_y: np.ndarray,
+                 left: np.ndarray, right: np.ndarray, trapezoid: np.ndarray, segments: np.ndarray,
+                 trapezoid_points: np.ndarray, trapezoid_segments: np.ndarray, region: np.ndarray, bbox: np.ndarray):
+        self.kind = kind
+        self.x = x
+        self.y = y
+        self.end_x = end_x
+        self.end_y = end_y
+        self.left = left
+        self.right = right
+        self.trapezoid = trapezoid
+        self.segments = segments
+        self.trapezoid_points = trapezoid_points
+        self.trapezoid_segments = trapezoid_segments
+        self.region = region
+        self.bbox = bbox
+        self.profiler: QueryProfiler = None
+
+    def __len__(self) -> int:
+        return len(self.kind)
+
+    @staticmethod
+    def from_tree(tree: DTree, trapezoids: list[Trapezoid], bbox: tuple[float, float, float, float]) -> CompiledTree:
+        order = []
+        index = {}
+        stack = [tree.root]
+        while stack:
+            node = stack.pop()
+            if node in index:
+                continue
+            index[node] = len(order)
+            order.append(node)
+            if node.kind != LEAF:
+                stack.append(node.right)
+                stack.append(node.left)
+
+        n = len(order)
+        kind = np.empty(n, dtype=np.int8)
+        x = np.zeros(n, dtype=np.float64)
+        y = np.zeros(n, dtype=np.float64)
+        end_x = np.zeros(n, dtype=np.float64)
+        end_y = np.zeros(n, dtype=np.float64)
+        left = np.full(n, -1, dtype=np.int32)
+        right = np.full(n, -1, dtype=np.int32)
+        trapezoid = np.full(n, -1, dtype=np.int64)
+
+        for i, node in enumerate(order):
+            kind[i] = node.kind
+            if node.kind == LEAF:
+                trapezoid[i] = node.data.id
+                continue
+            if node.kind == X_NODE:
+                x[i], y[i] = node.data.x, node.data.y
+            else:
+                x[i], y[i] = node.data.left.x, node.data.left.y
+                end_x[i], end_y[i] = node.data.right.x, node.data.right.y
+            left[i] = index[node.left]
+            right[i] = index[node.right]
+
+        segment_index = {}
+        segments = []
+        trapezoid_points = np.empty((len(trapezoids), 4), dtype=np.float64)
+        trapezoid_segments = np.empty((len(trapezoids), 2), dtype=np.int32)
+        region = np.empty(len(trapezoids), dtype=np.int64)
+        for i, t in enumerate(trapezoids):
+            for j, s in enumerate((t.up, t.down)):
+                if id(s) not in segment_index:
+                    segment_index[id(s)] = len(segments)
+                    segments.append((s.left.x, s.left.y, s.right.x, s.right.y))
+                trapezoid_segments[i, j] = segment_index[id(s)]
+            trapezoid_points[i] = t.left.x, t.left.y, t.right.x, t.right.y
+            region[i] = CompiledTree.NO_REGION if t.region is None else t.region
+
+        segments = np.array(segments, dtype=np.float64).reshape(-1, 4)
+        return CompiledTree(kind, x, y, end_x, end_y, left, right, trapezoid, segments, trapezoid_points,
+                            trapezoid_segments, region, np.array(bbox, dtype=np.float64))
+
+    def locate_many(self, points) -> np.ndarray:
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        px = points[:, 0]
+        py = points[:, 1]
+
+        profiler = self.profiler
+        if profiler is not None:
+            start = time.perf_counter_ns()
+            x_counts = np.zeros(len(points), dtype=np.int64)
+            y_counts = np.zeros(len(points), dtype=np.int64)
+
+        current = np.zeros(len(points), dtype=np.int32)
+        active = np.arange(len(points)) if self.kind[0] != LEAF else np.empty(0, dtype=np.int64)
+        while active.size:
+            nodes = current[active]
+            x = px[active]
+            y = py[active]
+            is_x = self.kind[nodes] == X_NODE
+            if profiler is not None:
+                x_counts[active] += is_x
+                y_counts[active] += ~is_x
+            node_x = self.x[nodes]
+            node_y = self.y[nodes]
+            end_x = self.end_x[nodes]
+            end_y = self.end_y[nodes]
+            det_left = (x - end_x) * (node_y - end_y)
+            det_right = (y - end_y) * (node_x - end_x)
+            det = det_left - det_right
+            go_left = np.where(is_x, (x < node_x) | ((x == node_x) & (y < node_y)), det >= 0)
+            bound = ERROR_BOUND * np.abs(det_left + det_right)
+            uncertain = np.flatnonzero(~is_x & (np.abs(det) <= bound) & (bound > 0))
+            for i in uncertain.tolist():
+                go_left[i] = Point.exact_orientation(node_x[i], node_y[i], end_x[i], end_y[i], x[i], y[i]) >= 0
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+            current[active] = nodes
+            active = active[self.kind[nodes] != LEAF]
+
+        if profiler is not None:
+            profiler.record_many(x_counts, y_counts, time.perf_counter_ns() - start)
+
+        min_x, min_y, max_x, max_y = self.bbox.tolist()
+        result = self.trapezoid[current].astype(np.int64, copy=False)
+        result[(px < min_x) | (px > max_x) | (py < min_y) | (py > max_y)] = CompiledTree.OUTSIDE
+        return result
+
+    def locate_regions(self, points) -> np.ndarray:
+        ids = self.locate_many(points)
+        return np.where(ids == CompiledTree.OUTSIDE, CompiledTree.NO_REGION, self.region[ids])
+
+    def save(self, path: str):
+        arrays = [np.ascontiguousarray(getattr(self, name)) for name in CompiledTree.FIELDS]
+        offset = CompiledTree.HEADER.size + CompiledTree.FIELD.size * len(arrays)
+        directory = []
+        for name, array in zip(CompiledTree.FIELDS, arrays):
+            offset = -(-offset // CompiledTree.ALIGNMENT) * CompiledTree.ALIGNMENT
+            cols = array.shape[1] if array.ndim == 2 else 0
+            directory.append((name, array, cols, offset))
+            offset += array.nbytes
+
+        with open(path, 'wb') as f:
+            f.write(CompiledTree.HEADER.pack(CompiledTree.MAGIC, CompiledTree.VERSION, len(directory)))
+            for name, array, cols, offset in directory:
+                f.write(CompiledTree.FIELD.pack(name.encode(), array.dtype.str.encode(), len(array), cols, offset))
+            for name, array, cols, offset in directory:
+                f.seek(offset)
+                f.write(array.tobytes())
+
+    @staticmethod
+    def load(path: str, use_mmap: bool = True) -> CompiledTree:
+        with open(path, 'rb') as f:
+            if use_mmap:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                buffer = f.read()
+
+        magic, version, count = CompiledTree.HEADER.unpack_from(buffer, 0)
+        if magic != CompiledTree.MAGIC:
+            raise ValueError(f"{path} is not a trapezoidal map file")
+        if version != CompiledTree.VERSION:
+            raise ValueError(f"{path} has format version {version}, expected {CompiledTree.VERSION}")
+
+        arrays = {}
+        for i in range(count):
+            name, dtype, rows, cols, offset = CompiledTree.FIELD.unpack_from(
+                buffer, CompiledTree.HEADER.size + i * CompiledTree.FIELD.size)
+            array = np.frombuffer(buffer, dtype=np.dtype(dtype.rstrip(b'\0').decode()), count=rows * max(cols, 1),
+                                  offset=offset)
+            arrays[name.rstrip(b'\0').decode()] = array.reshape(rows, cols) if cols else array
+
+        return CompiledTree(**{name: arrays[name] for name in CompiledTree.FIELDS})
@@ -1,7 +1,13 @@
 from __future__ import annotations
-from typing import Tuple
+from typing import Tuple, TYPE_CHECKING
 from enum import Enum
-from .visualizer.main import Visualizer
+from fractions import Fraction
+import sys
+
+if TYPE_CHECKING:
+    from .visualizer.main import Visualizer
+    from .query_profiler import QueryProfiler
+    from .query_cache import QueryCache
 
 
 class Position(Enum):
@@ -10,7 +16,16 @@ class Position(Enum):
     ABOVE = 1
 
 
+X_NODE = 0
+Y_NODE = 1
+LEAF = 2
+
+ERROR_BOUND = (3 + 16 * 2 ** -53) * 2 ** -53
+
+
 class Point:
+    __slots__ = ('x', 'y')
+
     def __init__(self, x: float, y: float):
         self.x = x
         self.y = y
@@ -22,10 +37,10 @@ class Point:
         return self.x, self.y
 
     def __lt__(self, other: Point) -> bool:
-        return self.x < other.x
+        return self.x < other.x or (self.x == other.x and self.y < other.y)
 
     def __gt__(self, other: Point) -> bool:
-        return self.x > other.x
+        return self.x > other.x or (self.x == other.x and self.y > other.y)
 
     def is_left(self, q: Point) -> bool:
         return self < q
@@ -34,32 +49,54 @@ class Point:
     def cross_product(p: Point, q: Point, r: Point) -> float:
         return (q.x - p.x) * (r.y - q.y) - (q.y - p.y) * (r.x - q.x)
 
+    @staticmethod
+    def orientation(p: Point, q: Point, r: Point) -> int:
+        det_left = (r.x - q.x) * (p.y - q.y)
+        det_right = (r.y - q.y) * (p.x - q.x)
+        det = det_left - det_right
+        bound = ERROR_BOUND * abs(det_left + det_right)
+        if det > bound:
+            return 1
+        if det < -bound:
+            return -1
+        if bound == 0:
+            return 0
+        return Point.exact_orientation(p.x, p.y, q.x, q.y, r.x, r.y)
+
+    @staticmethod
+    def exact_orientation(px: float, py: float, qx: float, qy: float, rx: float, ry: float) -> int:
+        qx = Fraction(qx)
+        qy = Fraction(qy)
+        det = (Fraction(rx) - qx) * (Fraction(py) - qy) - (Fraction(ry) - qy) * (Fraction(px) - qx)
+        return (det > 0) - (det < 0)
+
     def __eq__(self, other: Point) -> bool:
         return self.x == other.x and self.y == other.y
 
 
 class Segment:
-    eps = 10 ** -16
+    __slots__ = ('left', 'right', 'above', 'below', 'index')
 
-    def __init__(self, p: Point, q: Point):
-        if p.x < q.x:
+    def __init__(self, p: Point, q: Point, above: int = None, below: int = None):
+        if p < q:
             self.left = p
             self.right = q
         else:
             self.left = q
             self.right = p
 
-        self.a = (self.left.y - self.right.y) / (self.left.x - self.right.x)
-        self.b = self.right.y - self.right.x * self.a
+        self.above = above
+        self.below = below
+        self.index = None
 
     def __repr__(self) -> str:
         return f"[{self.left}, {self.right}]"
 
     def position(self, q: Point) -> Position:
-        cross_product = Point.cross_product(self.left, self.right, q)
-        if cross_product > Segment.eps:
+        orientation = Point.orientation(self.left, self.right, q)
+        if orientation > 0:
             return Position.ABOVE
-        elif cross_product < -Segment.eps:
+        elif orientation < 0:
             return Position.BELOW
         return Position.ON
 
@@ -69,14 +106,29 @@ class Segment:
     def get_points(self):
         return self.left, self.right
 
+    def is_vertical(self) -> bool:
+        return self.left.x == self.right.x
+
     def get_y_from_x(self, x):
-        return self.a * x + self.b
+        if self.is_vertical():
+            return self.left.y
+        if x - self.left.x <= self.right.x - x:
+            return self.left.y + (self.right.y - self.left.y) * ((x - self.left.x) / (self.right.x - self.left.x))
+        return self.right.y - (self.right.y - self.left.y) * ((self.right.x - x) / (self.right.x - self.left.x))
+
+    def get_y_at(self, p: Point):
+        if self.is_vertical():
+            return min(max(p.y, self.left.y), self.right.y)
+        return self.get_y_from_x(p.x)
 
     def __eq__(self, other: Segment) -> bool:
         return self.left == other.left and self.right == other.right
 
 
 class Trapezoid:
+    __slots__ = ('left', 'right', 'up', 'down', 'top_left', 'bottom_left', 'top_right', 'bottom_right', 'node', 'id',
+                 'region')
+
     def __init__(self, left: Point, right: Point, up: Segment, down: Segment):
         self.left = left
         self.right = right
@@ -89,6 +141,13 @@ class Trapezoid:
         self.bottom_right = None
 
         self.node = None
+        self.id = None
+        self.region = None
+
+    def get_region(self) -> (int, None):
+        if self.up.below is not None:
+            return self.up.below
+        return self.down.above
 
     def get_neighbours(self):
         return [self.top_left, self.bottom_left, self.top_right, self.bottom_right]
@@ -97,10 +156,10 @@ class Trapezoid:
         return f"[{self.left}, {self.right}, {self.up}, {self.down}]"
 
     def get_points(self, as_tuples=False) -> tuple:
-        p1 = Point(self.left.x, self.down.get_y_from_x(self.left.x))
-        p2 = Point(self.right.x, self.down.get_y_from_x(self.right.x))
-        p3 = Point(self.right.x, self.up.get_y_from_x(self.right.x))
-        p4 = Point(self.left.x, self.up.get_y_from_x(self.left.x))
+        p1 = Point(self.left.x, self.down.get_y_at(self.left))
+        p2 = Point(self.right.x, self.down.get_y_at(self.right))
+        p3 = Point(self.right.x, self.up.get_y_at(self.right))
+        p4 = Point(self.left.x, self.up.get_y_at(self.left))
         if not as_tuples:
             return p1, p2, p3, p4
         return p1.to_tuple(), p2.to_tuple(), p3.to_tuple(), p4.to_tuple()
@@ -138,175 +197,297 @@ class Trapezoid:
         return id(self)
 
 
-class Leaf:
-    def __init__(self, trapezoid: Trapezoid):
-        if trapezoid is not None:
-            self.trapezoid = trapezoid
-            self.trapezoid.leaf = self
-
-    def __repr__(self) -> str:
-        return f"{self.trapezoid}"
-
-    def __eq__(self, other: Leaf) -> bool:
-        return self.trapezoid == other.trapezoid
+class Node:
+    __slots__ = ('kind', 'data', 'left', 'right')
 
+    def __init__(self, kind: int, data: (Point, Segment, Trapezoid), left: (Node, None) = None,
+                 right: (Node, None) = None):
+        self.kind = kind
+        self.data = data
+        self.left = left
+        self.right = right
 
-class Node:
-    def __init__(self, node: (XNode, YNode, Leaf)):
-        self.node = node
+    @staticmethod
+    def leaf(trapezoid: Trapezoid) -> Node:
+        node = Node(LEAF, trapezoid)
+        trapezoid.node = node
+        return node
+
+    def set(self, kind: int, data: (Point, Segment), left: Node, right: Node):
+        self.kind = kind
+        self.data = data
+        self.left = left
+        self.right = right
 
     def is_x_node(self) -> bool:
-        return isinstance(self.node, XNode)
+        return self.kind == X_NODE
 
     def is_y_node(self) -> bool:
-        return isinstance(self.node, YNode)
+        return self.kind == Y_NODE
 
     def is_leaf(self) -> bool:
-        return isinstance(self.node, Leaf)
+        return self.kind == LEAF
 
-    def are_same_type(self, second: Node):
-        if (self.is_leaf() and second.is_leaf()) or (self.is_y_node() and second.is_y_node()) or (
-                self.is_x_node() and second.is_x_node()):
-            return True
-
-        return False
-
-    def __eq__(self, other: Node):
-        if self.are_same_type(other):
-            return self.node == other.node
-        return False
+    def __repr__(self) -> str:
+        return f"{self.data}"
 
 
-class XYNode:
+class DTree:
     def __init__(self):
-        self.left = None
-        self.right = None
+        self.root = None
+        self.profiler: QueryProfiler = None
+        self.cache: QueryCache = None
+
+    def find(self, node: Node, point: Point, vis: Visualizer = None, end: Point = None) -> Node:
+        if vis is None:
+            if self.cache is not None and node is self.root and end is None:
+                return self.locate(point.x, point.y).node
+            if self.profiler is None:
+                return self.descend(node, point.x, point.y, end)
+            return self.profiler.descend(node, point.x, point.y, end)
+
+        while node.kind != LEAF:
+            if node.kind == X_NODE:
+                vis.add_point(node.data.to_tuple(), color="cyan")
+                node = node.left if node.data > point else node.right
+            else:
+                vis.add_line_segment(node.data.to_tuple(), color="cyan")
+                node = node.left if DTree.goes_left(node.data, point.x, point.y, end) else node.right
 
+        vis.add_polygon(node.data.get_points(as_tuples=True), color="cyan")
+        return node
 
-class XNode(XYNode):
-    def __init__(self, p: Point):
-        super().__init__()
-        self.p = p
+    @staticmethod
+    def goes_left(segment: Segment, x: float, y: float, end: Point = None) -> bool:
+        left = segment.left
+        right = segment.right
+        det_left = (x - right.x) * (left.y - right.y)
+        det_right = (y - right.y) * (left.x - right.x)
+        det = det_left - det_right
+        bound = ERROR_BOUND * abs(det_left + det_right)
+        if det > bound:
+            return True
+        if det < -bound:
+            return False
 
-    def __eq__(self, other: XNode):
-        return self.p == other.p
+        orientation = Point.exact_orientation(left.x, left.y, right.x, right.y, x, y) if bound else 0
+        if orientation == 0 and end is not None:
+            return segment.position(end) == Position.ABOVE
+        return orientation >= 0
 
+    @staticmethod
+    def descend(node: Node, x: float, y: float, end: Point = None) -> Node:
+        kind = node.kind
+        while kind != LEAF:
+            if kind == X_NODE:
+                p = node.data
+                node = node.left if x < p.x or (x == p.x and y < p.y) else node.right
+            else:
+                left = node.data.left
+                right = node.data.right
+                det_left = (x - right.x) * (left.y - right.y)
+                det_right = (y - right.y) * (left.x - right.x)
+                det = det_left - det_right
+                bound = ERROR_BOUND * abs(det_left + det_right)
+                if det > bound:
+                    node = node.left
+                elif det < -bound:
+                    node = node.right
+                else:
+                    node = node.left if DTree.goes_left(node.data, x, y, end) else node.right
+            kind = node.kind
+
+        return node
+
+    def find_adjacent(self, s: Segment, above: bool) -> Trapezoid:
+        p = s.left
+        node = self.root
+        while node.kind != LEAF:
+            if node.kind == X_NODE:
+                node = node.left if node.data > p else node.right
+            elif node.data is s:
+                node = node.left if above else node.right
+            else:
+                position = node.data.position(p)
+                if position == Position.ABOVE:
+                    node = node.left
+                elif position == Position.BELOW:
+                    node = node.right
+                elif node.data.position(s.right) == Position.ABOVE:
+                    node = node.left
+                else:
+                    node = node.right
 
-class YNode(XYNode):
-    def __init__(self, s: Segment):
-        super().__init__()
-        self.s = s
+        return node.data
 
-    def __eq__(self, other: YNode):
-        return self.s == other.s
+    def locate(self, x: float, y: float, end: Point = None) -> Trapezoid:
+        cache = self.cache
+        if cache is not None and end is None:
+            trapezoid = cache.lookup(x, y)
+            if trapezoid is not None:
+                return trapezoid
 
+        if self.profiler is None:
+            trapezoid = DTree.descend(self.root, x, y, end).data
+        else:
+            trapezoid = self.profiler.descend(self.root, x, y, end).data
 
-class DTree:
-    def __init__(self):
-        self.root = None
+        if cache is not None and end is None:
+            cache.store(x, y, trapezoid)
+        return trapezoid
 
-    def find(self, node: Node, point: Point, vis: Visualizer = None, a: float = None):
-        if node.is_leaf():
-            if vis is not None:
-                vis.add_polygon(node.node.trapezoid.get_points(as_tuples=True), color="cyan")
+    @staticmethod
+    def __skip(node: Node) -> Node:
+        if node.kind == LEAF:
             return node
-        elif node.is_x_node():
-            if vis is not None:
-                vis.add_point(node.node.p.to_tuple(), color="cyan")
-            if node.node.p > point:
-                return self.find(node.node.left, point, vis, a)
+        left = node.left
+        right = node.right
+        if left is right or (left.kind == right.kind != LEAF and left.data is right.data and
+                             left.left is right.left and left.right is right.right):
+            return left
+        return node
+
+    def collapse(self, x: float, y: float):
+        path = []
+        node = self.root
+        while node.kind != LEAF:
+            path.append(node)
+            if node.kind == X_NODE:
+                p = node.data
+                node = node.left if x < p.x or (x == p.x and y < p.y) else node.right
             else:
-                return self.find(node.node.right, point, vis, a)
-        else:
-            if vis is not None:
-                vis.add_line_segment(node.node.s.to_tuple(), color="cyan")
-            position = node.node.s.position(point)
-            if position == Position.ABOVE:
-                return self.find(node.node.left, point, vis, a)
-            elif position == Position.BELOW:
-                return self.find(node.node.right, point, vis, a)
+                node = node.left if DTree.goes_left(node.data, x, y) else node.right
+
+        for node in reversed(path):
+            node.left = DTree.__skip(node.left)
+            node.right = DTree.__skip(node.right)
+        self.root = DTree.__skip(self.root)
+
+    def get_trapezoids(self) -> list[Trapezoid]:
+        trapezoids = []
+        visited = set()
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node in visited:
+                continue
+            visited.add(node)
+            if node.kind == LEAF:
+                trapezoids.append(node.data)
             else:
-                if node.node.s.a < a:
-                    return self.find(node.node.left, point, vis, a)
-                else:
-                    return self.find(node.node.right, point, vis, a)
-
-    def find_node(self, target_node: Node):
-        trapezoid = target_node.node.trapezoid
-        mid_x = (trapezoid.left.x + trapezoid.right.x) / 2
-        mid_upper_y = trapezoid.up.a * mid_x + trapezoid.up.b
-        mid_lower_y = trapezoid.down.a * mid_x + trapezoid.down.b
-        mid_point = Point(mid_x, mid_lower_y + (mid_upper_y - mid_lower_y) / 2)
-
-        node_found = self.find(self.root, mid_point, None, trapezoid.down.a)
-
-        return node_found
+                stack.append(node.right)
+                stack.append(node.left)
+
+        return trapezoids
+
+    def depth(self) -> int:
+        depth = {}
+        stack = [self.root]
+        while stack:
+            node = stack[-1]
+            if node in depth:
+                stack.pop()
+            elif node.kind == LEAF:
+                depth[node] = 0
+                stack.pop()
+            elif node.left in depth and node.right in depth:
+                depth[node] = 1 + max(depth[node.left], depth[node.right])
+                stack.pop()
+            else:
+                stack.append(node.left)
+                stack.append(node.right)
+
+        return depth[self.root]
+
+    def stats(self) -> dict:
+        parents = {self.root: 0}
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node.kind != LEAF:
+                for child in (node.left, node.right):
+                    if child in parents:
+                        parents[child] += 1
+                    else:
+                        parents[child] = 1
+                        stack.append(child)
+
+        depth = {self.root: 0}
+        counts = [0, 0, 0]
+        histogram = []
+        segments = {}
+        points = set()
+        inner = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            d = depth[node]
+            counts[node.kind] += 1
+            if node.kind == LEAF:
+                while len(histogram) <= d:
+                    histogram.append(0)
+                histogram[d] += 1
+                t = node.data
+                segments[id(t.up)] = t.up
+                segments[id(t.down)] = t.down
+                points.add(id(t.left))
+                points.add(id(t.right))
+                continue
+            inner.append(node)
+            for child in (node.left, node.right):
+                if depth.get(child, -1) <= d:
+                    depth[child] = d + 1
+                parents[child] -= 1
+                if parents[child] == 0:
+                    stack.append(child)
+
+        for segment in segments.values():
+            points.add(id(segment.left))
+            points.add(id(segment.right))
+        dead = sum(1 for node in inner if node.left is node.right or
+                   id(node.data) not in (points if node.kind == X_NODE else segments))
+
+        leaves = counts[LEAF]
+        float_size = sys.getsizeof(0.0)
+        memory = (len(parents) - leaves) * sys.getsizeof(Node(X_NODE, None)) + \
+            leaves * (sys.getsizeof(Node(LEAF, None)) + sys.getsizeof(Trapezoid(None, None, None, None))) + \
+            len(segments) * sys.getsizeof(Segment(Point(0, 0), Point(1, 1))) + \
+            len(points) * (sys.getsizeof(Point(0, 0)) + 2 * float_size)
+
+        return {
+            'nodes': len(parents),
+            'x_nodes': counts[X_NODE],
+            'y_nodes': counts[Y_NODE],
+            'leaves': leaves,
+            'max_depth': len(histogram) - 1,
+            'mean_depth': sum(d * c for d, c in enumerate(histogram)) / leaves,
+            'depth_histogram': histogram,
+            'dead_nodes': dead,
+            'memory_bytes': memory,
+        }
 
     def update_single(self, trapezoid: Trapezoid, s: Segment, up: Trapezoid, down: Trapezoid, left: (Trapezoid, None),
                       right: (Trapezoid, None)):
-        to_swap = self.find_node(trapezoid.node)
+        to_swap = trapezoid.node
         p, q = s.get_points()
 
-        segment_left = Node(XNode(p))
-        segment_right = Node(XNode(q))
-        segment = Node(YNode(s))
-
         if left and right:
-            if to_swap == self.root:
-                self.root.node = segment_left.node
-            else:
-                to_swap.node = segment_left.node
-
-            segment_left.node.left = left.node
-            segment_left.node.right = segment_right
-
-            segment_right.node.left = segment
-            segment_right.node.right = right.node
-
-            segment.node.left = up.node
-            segment.node.right = down.node
+            segment = Node(Y_NODE, s, up.node, down.node)
+            segment_right = Node(X_NODE, q, segment, right.node)
+            to_swap.set(X_NODE, p, left.node, segment_right)
 
         elif left and not right:
-            if to_swap == self.root:
-                self.root.node = segment_left.node
-            else:
-                to_swap.node = segment_left.node
-
-            segment_left.node.left = left.node
-            segment_left.node.right = segment
-
-            segment.node.left = up.node
-            segment.node.right = down.node
+            segment = Node(Y_NODE, s, up.node, down.node)
+            to_swap.set(X_NODE, p, left.node, segment)
 
         elif not left and right:
-            if to_swap == self.root:
-                self.root.node = segment_right.node
-            else:
-                to_swap.node = segment_right.node
+            segment = Node(Y_NODE, s, up.node, down.node)
+            to_swap.set(X_NODE, q, segment, right.node)
 
-            segment_right.node.left = segment
-            segment_right.node.right = right.node
-
-            segment.node.left = up.node
-            segment.node.right = down.node
         else:
-            if to_swap == self.root:
-                self.root.node = segment.node
-            else:
-                to_swap.node = segment.node
-
-            segment.node.left = up.node
-            segment.node.right = down.node
+            to_swap.set(Y_NODE, s, up.node, down.node)
 
     def update_multiple(self, trapezoids: list[Trapezoid], s: Segment, split_trapezoids: dict):
-        n = len(trapezoids)
-
-        for i in range(n):
-            trapezoid = trapezoids[i]
-            to_swap = self.find_node(trapezoid.node)
-            segment = Node(YNode(s))
-
-            to_swap.node = segment.node
-
-            segment.node.left = split_trapezoids[trapezoids[i]][0].node
-            segment.node.right = split_trapezoids[trapezoids[i]][1].node
+        for trapezoid in trapezoids:
+            top, bottom = split_trapezoids[trapezoid]
+            trapezoid.node.set(Y_NODE, s, top.node, bottom.node)
@@ -0,0 +1,77 @@
+from __future__ import annotations
+from collections import OrderedDict
+from .data_structures import Point, Trapezoid
+
+
+class QueryCache:
+    def __init__(self, size: int = 1024):
+        self.size = size
+        self.entries: OrderedDict[tuple[float, float], Trapezoid] = OrderedDict()
+        self.last: Trapezoid = None
+        self.reset()
+
+    def reset(self):
+        self.last_hits = 0
+        self.neighbour_hits = 0
+        self.point_hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.entries.clear()
+        self.last = None
+
+    @staticmethod
+    def contains(trapezoid: Trapezoid, x: float, y: float) -> bool:
+        left = trapezoid.left
+        right = trapezoid.right
+        if x < left.x or (x == left.x and y < left.y):
+            return False
+        if x > right.x or (x == right.x and y >= right.y):
+            return False
+
+        point = Point(x, y)
+        down = trapezoid.down
+        up = trapezoid.up
+        return Point.orientation(down.left, down.right, point) >= 0 and Point.orientation(up.left, up.right, point) < 0
+
+    def lookup(self, x: float, y: float) -> (Trapezoid, None):
+        last = self.last
+        if last is not None:
+            if QueryCache.contains(last, x, y):
+                self.last_hits += 1
+                return last
+            for neighbour in (last.top_left, last.bottom_left, last.top_right, last.bottom_right):
+                if neighbour is not None and QueryCache.contains(neighbour, x, y):
+                    self.neighbour_hits += 1
+                    self.last = neighbour
+                    return neighbour
+
+        trapezoid = self.entries.get((x, y))
+        if trapezoid is not None:
+            self.entries.move_to_end((x, y))
+            self.point_hits += 1
+            self.last = trapezoid
+            return trapezoid
+
+        self.misses += 1
+        return None
+
+    def store(self, x: float, y: float, trapezoid: Trapezoid):
+        self.last = trapezoid
+        if self.size <= 0:
+            return
+        self.entries[(x, y)] = trapezoid
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def summary(self) -> dict:
+        hits = self.last_hits + self.neighbour_hits + self.point_hits
+        queries = hits + self.misses
+        return {
+            'queries': queries,
+            'last_hits': self.last_hits,
+            'neighbour_hits': self.neighbour_hits,
+            'point_hits': self.point_hits,
+            'misses': self.misses,
+            'hit_rate': hits / max(queries, 1),
+        }
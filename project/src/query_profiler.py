@@ -0,0 +1,85 @@
+from __future__ import annotations
+import time
+import numpy as np
+from .data_structures import DTree, Node, Point, X_NODE, LEAF
+
+
+class QueryProfiler:
+    LATENCY_BUCKETS = 48
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.reset()
+
+    def reset(self):
+        self.queries = 0
+        self.x_comparisons = 0
+        self.y_comparisons = 0
+        self.path_lengths = np.zeros(0, dtype=np.int64)
+        self.latency = np.zeros(QueryProfiler.LATENCY_BUCKETS, dtype=np.int64)
+        self.batch_latency: list[tuple[int, int]] = []
+
+    def descend(self, node: Node, x: float, y: float, end: Point = None) -> Node:
+        goes_left = DTree.goes_left
+        start = time.perf_counter_ns()
+        x_count = 0
+        y_count = 0
+        kind = node.kind
+        while kind != LEAF:
+            if kind == X_NODE:
+                x_count += 1
+                p = node.data
+                node = node.left if x < p.x or (x == p.x and y < p.y) else node.right
+            else:
+                y_count += 1
+                node = node.left if goes_left(node.data, x, y, end) else node.right
+            kind = node.kind
+        elapsed = time.perf_counter_ns() - start
+
+        self.record(x_count, y_count, elapsed)
+        if self.callback is not None:
+            self.callback(x, y, node.data, x_count, y_count, elapsed)
+
+        return node
+
+    def record(self, x_count: int, y_count: int, elapsed_ns: int):
+        self.queries += 1
+        self.x_comparisons += x_count
+        self.y_comparisons += y_count
+        length = x_count + y_count
+        if length >= len(self.path_lengths):
+            self.path_lengths = np.pad(self.path_lengths, (0, length + 1 - len(self.path_lengths)))
+        self.path_lengths[length] += 1
+        self.latency[min(elapsed_ns.bit_length(), QueryProfiler.LATENCY_BUCKETS - 1)] += 1
+
+    def record_many(self, x_counts: np.ndarray, y_counts: np.ndarray, elapsed_ns: int):
+        n = len(x_counts)
+        if n == 0:
+            return
+
+        self.queries += n
+        self.x_comparisons += int(x_counts.sum())
+        self.y_comparisons += int(y_counts.sum())
+        lengths = np.bincount(x_counts + y_counts)
+        if len(lengths) > len(self.path_lengths):
+            self.path_lengths = np.pad(self.path_lengths, (0, len(lengths) - len(self.path_lengths)))
+        self.path_lengths[:len(lengths)] += lengths
+        self.batch_latency.append((n, elapsed_ns))
+
+    def summary(self) -> dict:
+        queries = max(self.queries, 1)
+        batch_queries = sum(size for size, _ in self.batch_latency)
+        batch_ns = sum(elapsed for _, elapsed in self.batch_latency)
+        return {
+            'queries': self.queries,
+            'x_comparisons': self.x_comparisons,
+            'y_comparisons': self.y_comparisons,
+            'mean_x_comparisons': self.x_comparisons / queries,
+            'mean_y_comparisons': self.y_comparisons / queries,
+            'max_path_length': len(self.path_lengths) - 1,
+            'path_length_histogram': self.path_lengths.tolist(),
+            'latency_histogram': {1 << (i - 1) if i else 0: int(c) for i, c in enumerate(self.latency) if c},
+            'batches': len(self.batch_latency),
+            'batch_queries': batch_queries,
+            'batch_ns_per_query': batch_ns / batch_queries if batch_queries else 0.0,
+        }
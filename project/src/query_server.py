@@ -0,0 +1,74 @@
+from __future__ import annotations
+import multiprocessing
+import os
+import tempfile
+import numpy as np
+from .compiled_tree import CompiledTree
+
+_worker_tree = None
+
+
+def _load_worker_tree(path: str):
+    global _worker_tree
+    _worker_tree = CompiledTree.load(path)
+
+
+def _locate_chunk(points: np.ndarray) -> np.ndarray:
+    return _worker_tree.locate_many(points)
+
+
+def _locate_regions_chunk(points: np.ndarray) -> np.ndarray:
+    return _worker_tree.locate_regions(points)
+
+
+class QueryServer:
+    def __init__(self, path: str, processes: int = None, chunk_size: int = 65536):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.owns_file = False
+        self.pool = multiprocessing.Pool(processes, initializer=_load_worker_tree, initargs=(path,))
+
+    @staticmethod
+    def from_map(trapezoidal_map, processes: int = None, chunk_size: int = 65536) -> QueryServer:
+        fd, path = tempfile.mkstemp(suffix='.trapmap')
+        os.close(fd)
+        trapezoidal_map.save(path)
+        server = QueryServer(path, processes, chunk_size)
+        server.owns_file = True
+        return server
+
+    def __split(self, points) -> list[np.ndarray]:
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return [points[i:i + self.chunk_size] for i in range(0, len(points), self.chunk_size)]
+
+    def locate_many(self, points) -> np.ndarray:
+        chunks = self.__split(points)
+        if not chunks:
+            return np.empty(0, dtype=np.int64)
+
+        return np.concatenate(self.pool.map(_locate_chunk, chunks))
+
+    def locate_regions(self, points) -> np.ndarray:
+        chunks = self.__split(points)
+        if not chunks:
+            return np.empty(0, dtype=np.int64)
+
+        return np.concatenate(self.pool.map(_locate_regions_chunk, chunks))
+
+    def imap(self, batches, regions: bool = False):
+        locate = self.locate_regions if regions else self.locate_many
+        for batch in batches:
+            yield locate(batch)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        if self.owns_file:
+            os.remove(self.path)
+            self.owns_file = False
+
+    def __enter__(self) -> QueryServer:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,131 @@
+from __future__ import annotations
+import os
+import numpy as np
+from matplotlib import colormaps
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.figure import Figure
+from .compiled_tree import CompiledTree
+from .data_structures import LEAF
+
+
+class MapRenderer:
+    NO_REGION_COLOR = (0.9, 0.9, 0.9, 1.0)
+
+    def __init__(self, tree: CompiledTree, color_by: str = None, cmap: str = None, edge_color='black',
+                 line_width: float = 0.5):
+        if color_by not in (None, 'region', 'depth'):
+            raise ValueError(f"color_by must be None, 'region' or 'depth', not {color_by!r}")
+
+        self.tree = tree
+        self.edge_color = edge_color
+        self.line_width = line_width
+        self.bbox = tuple(tree.bbox.tolist())
+        self.corners = MapRenderer.__corners(tree)
+        self.colors = None
+        if color_by == 'region':
+            colormap = colormaps[cmap or 'tab20']
+            self.colors = colormap(tree.region % colormap.N)
+            self.colors[tree.region == CompiledTree.NO_REGION] = MapRenderer.NO_REGION_COLOR
+        elif color_by == 'depth':
+            depth = MapRenderer.leaf_depths(tree)
+            self.colors = colormaps[cmap or 'viridis'](depth / max(int(depth.max()), 1))
+
+    @staticmethod
+    def __y_at(segments: np.ndarray, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        x1, y1, x2, y2 = segments.T
+        vertical = x1 == x2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            from_left = y1 + (x - x1) * (y2 - y1) / (x2 - x1)
+            from_right = y2 + (x - x2) * (y2 - y1) / (x2 - x1)
+        interpolated = np.where(x - x1 <= x2 - x, from_left, from_right)
+        return np.where(vertical, np.clip(y, np.minimum(y1, y2), np.maximum(y1, y2)), interpolated)
+
+    @staticmethod
+    def __corners(tree: CompiledTree) -> np.ndarray:
+        left_x, left_y, right_x, right_y = np.asarray(tree.trapezoid_points).T
+        up = tree.segments[tree.trapezoid_segments[:, 0]]
+        down = tree.segments[tree.trapezoid_segments[:, 1]]
+        return np.stack((
+            np.stack((left_x, MapRenderer.__y_at(down, left_x, left_y)), axis=1),
+            np.stack((right_x, MapRenderer.__y_at(down, right_x, right_y)), axis=1),
+            np.stack((right_x, MapRenderer.__y_at(up, right_x, right_y)), axis=1),
+            np.stack((left_x, MapRenderer.__y_at(up, left_x, left_y)), axis=1),
+        ), axis=1)
+
+    @staticmethod
+    def leaf_depths(tree: CompiledTree) -> np.ndarray:
+        inner = np.flatnonzero(tree.kind != LEAF)
+        parents = np.concatenate((inner, inner))
+        children = np.concatenate((tree.left[inner], tree.right[inner]))
+        order = np.argsort(children, kind='stable')
+        parents = parents[order]
+        children, starts = np.unique(children[order], return_index=True)
+        depth = np.zeros(len(tree), dtype=np.int64)
+        while len(parents):
+            candidate = np.maximum.reduceat(depth[parents] + 1, starts)
+            if np.array_equal(candidate, depth[children]):
+                break
+            depth[children] = candidate
+
+        leaves = np.flatnonzero(tree.kind == LEAF)
+        result = np.zeros(len(tree.trapezoid_points), dtype=np.int64)
+        result[tree.trapezoid[leaves]] = depth[leaves]
+        return result
+
+    def __visible(self, bbox: tuple) -> np.ndarray:
+        min_x, min_y, max_x, max_y = bbox
+        xs = self.corners[:, :, 0]
+        ys = self.corners[:, :, 1]
+        return np.flatnonzero((xs.max(axis=1) >= min_x) & (xs.min(axis=1) <= max_x) & (ys.max(axis=1) >= min_y) &
+                              (ys.min(axis=1) <= max_y))
+
+    def draw(self, ax, bbox: tuple = None) -> list:
+        bbox = bbox or self.bbox
+        visible = self.__visible(bbox)
+        corners = self.corners[visible]
+        artists = []
+        if self.colors is not None:
+            artists.append(ax.add_collection(PolyCollection(corners, facecolors=self.colors[visible],
+                                                            edgecolors='none')))
+        edges = np.concatenate((corners[:, [0, 1]], corners[:, [3, 2]], corners[:, [0, 3]], corners[:, [1, 2]]))
+        artists.append(ax.add_collection(LineCollection(edges, colors=self.edge_color, linewidths=self.line_width)))
+        ax.set_xlim(bbox[0], bbox[2])
+        ax.set_ylim(bbox[1], bbox[3])
+        return artists
+
+    def __figure(self, width: int, height: int, dpi: int):
+        fig = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+        FigureCanvasAgg(fig)
+        ax = fig.add_axes((0, 0, 1, 1))
+        ax.set_axis_off()
+        return fig, ax
+
+    def save(self, filename: str, width: int = 2048, dpi: int = 100):
+        min_x, min_y, max_x, max_y = self.bbox
+        height = max(1, round(width * (max_y - min_y) / (max_x - min_x)))
+        fig, ax = self.__figure(width, height, dpi)
+        self.draw(ax)
+        fig.savefig(filename)
+
+    def save_pyramid(self, directory: str, levels: int, tile_size: int = 256, dpi: int = 100) -> int:
+        min_x, min_y, max_x, max_y = self.bbox
+        side = max(max_x - min_x, max_y - min_y)
+        fig, ax = self.__figure(tile_size, tile_size, dpi)
+        count = 0
+        for level in range(levels):
+            tiles = 1 << level
+            size = side / tiles
+            for i in range(tiles):
+                os.makedirs(os.path.join(directory, str(level), str(i)), exist_ok=True)
+                for j in range(tiles):
+                    top = max_y - j * size
+                    if min_x + i * size > max_x or top < min_y:
+                        continue
+                    artists = self.draw(ax, (min_x + i * size, top - size, min_x + (i + 1) * size, top))
+                    fig.savefig(os.path.join(directory, str(level), str(i), f'{j}.png'))
+                    for artist in artists:
+                        artist.remove()
+                    count += 1
+
+        return count
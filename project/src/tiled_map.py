@@ -0,0 +1,157 @@
+from __future__ import annotations
+import multiprocessing
+import numpy as np
+from .compiled_tree import CompiledTree
+from .trapezoidal_map import TrapezoidalMap
+
+
+def _build_tile(job) -> (CompiledTree, np.ndarray):
+    segments, labels, seed, bbox = job
+    trapezoidal_map = TrapezoidalMap(segments, labels, seed, bbox)
+    trapezoidal_map.build_trapezoidal_map()
+    tree = trapezoidal_map.compile()
+    if labels is None:
+        return tree, None
+
+    top = trapezoidal_map.rect_bound.up
+    bottom = trapezoidal_map.rect_bound.down
+    sides = [(TiledMap.BORDER if t.up is top else CompiledTree.NO_REGION if t.up.below is None else t.up.below,
+              TiledMap.BORDER if t.down is bottom else CompiledTree.NO_REGION if t.down.above is None else t.down.above)
+             for t in trapezoidal_map.get_trapezoids()]
+    return tree, np.array(sides, dtype=np.int64).reshape(-1, 2)
+
+
+class TiledMap:
+    OUTSIDE = CompiledTree.OUTSIDE
+    BORDER = -2
+
+    def __init__(self, S: list[tuple[tuple[float, float], tuple[float, float]]] | np.ndarray,
+                 tiles: tuple[int, int] = (4, 4), labels: list[tuple[(int, None), (int, None)]] = None,
+                 seed: int = None, bbox: tuple[float, float, float, float] = None):
+        segments = np.asarray(S, dtype=float).reshape(-1, 2, 2)
+        bounds = None
+        if len(segments):
+            bounds = (float(segments[:, :, 0].min()), float(segments[:, :, 1].min()),
+                      float(segments[:, :, 0].max()), float(segments[:, :, 1].max()))
+        self.bbox = TrapezoidalMap.create_bbox(bounds, bbox)
+        min_x, min_y, max_x, max_y = self.bbox
+
+        self.shape = tiles
+        self.x_edges = np.linspace(min_x, max_x, tiles[0] + 1)
+        self.y_edges = np.linspace(min_y, max_y, tiles[1] + 1)
+        self.seed = seed
+        self.jobs = self.__partition(segments, labels)
+        self.tiles: list[CompiledTree] = None
+        self.offsets = None
+
+    def __partition(self, segments: np.ndarray, labels: list[tuple] = None) -> list[tuple]:
+        jobs = []
+        origin = np.arange(len(segments))
+        for i in range(self.shape[0]):
+            x0, x1 = self.x_edges[i], self.x_edges[i + 1]
+            column, column_origin = TiledMap.__clip(segments, origin, 0, x0, x1)
+            for j in range(self.shape[1]):
+                y0, y1 = self.y_edges[j], self.y_edges[j + 1]
+                tile, tile_origin = TiledMap.__clip(column, column_origin, 1, y0, y1)
+                tile_labels = None if labels is None else [labels[k] for k in tile_origin.tolist()]
+                margin = max(x1 - x0, y1 - y0) * 0.01
+                seed = None if self.seed is None else self.seed + len(jobs)
+                jobs.append((tile, tile_labels, seed, (x0 - margin, y0 - margin, x1 + margin, y1 + margin)))
+
+        return jobs
+
+    @staticmethod
+    def __clip(segments: np.ndarray, origin: np.ndarray, axis: int, low: float, high: float) -> (np.ndarray,
+                                                                                                 np.ndarray):
+        a = segments[:, 0, axis]
+        b = segments[:, 1, axis]
+        overlap = np.flatnonzero((np.minimum(a, b) <= high) & (np.maximum(a, b) >= low))
+        p = segments[overlap, 0]
+        q = segments[overlap, 1]
+        d = q - p
+        a = p[:, axis]
+        da = d[:, axis]
+        flat = da == 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t_low = (low - a) / da
+            t_high = (high - a) / da
+        t_start = np.where(flat, 0, np.clip(np.minimum(t_low, t_high), 0, 1))
+        t_end = np.where(flat, 1, np.clip(np.maximum(t_low, t_high), 0, 1))
+
+        start = p + t_start[:, None] * d
+        end = q - (1 - t_end)[:, None] * d
+        start[:, axis] = np.clip(start[:, axis], low, high)
+        end[:, axis] = np.clip(end[:, axis], low, high)
+        keep = (start != end).any(axis=1)
+        return np.stack((start[keep], end[keep]), axis=1), origin[overlap[keep]]
+
+    def build_tiled_map(self, processes: int = None) -> list[CompiledTree]:
+        if processes == 1:
+            results = [_build_tile(job) for job in self.jobs]
+        else:
+            with multiprocessing.Pool(processes) as pool:
+                results = pool.map(_build_tile, self.jobs, chunksize=1)
+
+        self.tiles = [tree for tree, _ in results]
+        if results and results[0][1] is not None:
+            self.__resolve_regions([sides for _, sides in results])
+        self.offsets = np.cumsum([0] + [len(tile.trapezoid_points) for tile in self.tiles])
+        return self.tiles
+
+    def __resolve_regions(self, sides: list[np.ndarray]):
+        for k, tile in enumerate(self.tiles):
+            i, j = divmod(k, self.shape[1])
+            x = np.asarray(tile.trapezoid_points)[:, [0, 2]].mean(axis=1)
+            up = sides[k][:, 0].copy()
+            down = sides[k][:, 1].copy()
+            border = np.flatnonzero(up == TiledMap.BORDER)
+            up[border] = self.__walk(sides, i, j, x[border], 1)
+            border = np.flatnonzero((up < 0) & (down == TiledMap.BORDER))
+            down[border] = self.__walk(sides, i, j, x[border], -1)
+            tile.region = np.where(up >= 0, up, down)
+
+    def __walk(self, sides: list[np.ndarray], i: int, j: int, x: np.ndarray, step: int) -> np.ndarray:
+        result = np.full(len(x), CompiledTree.NO_REGION, dtype=np.int64)
+        active = np.arange(len(x))
+        j += step
+        while active.size and 0 <= j < self.shape[1]:
+            k = i * self.shape[1] + j
+            y = self.y_edges[j] if step > 0 else self.y_edges[j + 1]
+            ids = self.tiles[k].locate_many(np.stack((x[active], np.full(len(active), y)), axis=1))
+            labels = sides[k][ids, 0 if step > 0 else 1]
+            found = labels != TiledMap.BORDER
+            result[active[found]] = labels[found]
+            active = active[~found]
+            j += step
+
+        return result
+
+    def tile_of(self, points) -> np.ndarray:
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        min_x, min_y, max_x, max_y = self.bbox
+        column = np.clip(np.searchsorted(self.x_edges, points[:, 0], side='right') - 1, 0, self.shape[0] - 1)
+        row = np.clip(np.searchsorted(self.y_edges, points[:, 1], side='right') - 1, 0, self.shape[1] - 1)
+        result = column * self.shape[1] + row
+        result[(points[:, 0] < min_x) | (points[:, 0] > max_x) | (points[:, 1] < min_y) |
+               (points[:, 1] > max_y)] = TiledMap.OUTSIDE
+        return result
+
+    def __route(self, points, locate, fill: int) -> np.ndarray:
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        tiles = self.tile_of(points)
+        order = np.argsort(tiles, kind='stable')
+        bounds = np.searchsorted(tiles[order], np.arange(len(self.tiles) + 1))
+        result = np.full(len(points), fill, dtype=np.int64)
+        for i, tile in enumerate(self.tiles):
+            indices = order[bounds[i]:bounds[i + 1]]
+            if len(indices):
+                result[indices] = locate(i, tile, points[indices])
+
+        return result
+
+    def locate_many(self, points) -> np.ndarray:
+        return self.__route(points, lambda i, tile, chunk: tile.locate_many(chunk) + self.offsets[i],
+                            TiledMap.OUTSIDE)
+
+    def locate_regions(self, points) -> np.ndarray:
+        return self.__route(points, lambda i, tile, chunk: tile.locate_regions(chunk), CompiledTree.NO_REGION)
@@ -1,33 +1,261 @@
+from __future__ import annotations
 from .data_structures import *
-from .visualizer.main import Visualizer
+from .compiled_tree import CompiledTree
+from typing import TYPE_CHECKING
+import numpy as np
+import math
 import random
 
-class TrapezoidalMap:
+if TYPE_CHECKING:
+    from .visualizer.main import Visualizer
+    from .query_profiler import QueryProfiler
+    from .query_cache import QueryCache
 
-    def __init__(self, S: list[tuple[tuple[float, float], tuple[float, float]]]):
-        permuted_s = random.sample(S, len(S))
-        self.segments = self.__create_segments(permuted_s)
+class TrapezoidalMap:
+    OUTSIDE = -1
+
+    def __init__(self, S: list[tuple[tuple[float, float], tuple[float, float]]] | np.ndarray,
+                 labels: list[tuple[(int, None), (int, None)]] = None, seed: int = None,
+                 bbox: tuple[float, float, float, float] = None):
+        self.random = random.Random(seed)
+        self.segments, bounds = self.__create_segments(S, labels, self.random)
+        self.bbox = TrapezoidalMap.create_bbox(bounds, bbox)
         self.rect_bound = self.__create_rect_bound()
         self.tree = DTree()
-        self.tree.root = Node(Leaf(self.rect_bound))
-
-        self.vis = Visualizer()
-        self.vis.add_line_segment([self.rect_bound.up.to_tuple(), self.rect_bound.down.to_tuple()], color='red')
-        ls = self.vis.add_line_segment(self.rect_bound.get_segments(as_tuples=True))
-        self.get_remove_handle = {self.rect_bound: ls}
+        self.tree.root = Node.leaf(self.rect_bound)
+        self.build_attempts = 0
+        self.max_depth_factor = None
+        self.max_attempts = 10
+        self.removals = 0
+        self.rebuild_threshold = 0.25
+        self.trapezoids = None
+        self.compiled = None
+
+        self.__vis = None
+        self.get_remove_handle = {}
         self.update_visualizer = False
 
-    def build_trapezoidal_map(self):
-        for i in range(len(self.segments)):
-            intersected_trapezoids = self.follow_segment(self.segments[i])
-            self.update_map(intersected_trapezoids, self.segments[i])
+    @property
+    def vis(self) -> Visualizer:
+        if self.__vis is None:
+            from .visualizer.main import Visualizer
+
+            self.__vis = Visualizer()
+            self.__vis.add_line_segment([self.rect_bound.up.to_tuple(), self.rect_bound.down.to_tuple()], color='red')
+            ls = self.__vis.add_line_segment(self.rect_bound.get_segments(as_tuples=True))
+            self.get_remove_handle[self.rect_bound] = ls
+
+        return self.__vis
+
+    def build_trapezoidal_map(self, max_depth_factor: float = None, max_attempts: int = 10):
+        if self.tree.root.kind != LEAF:
+            self.__reset()
+        self.trapezoids = None
+        self.compiled = None
+        self.build_attempts = 0
+        self.max_depth_factor = max_depth_factor
+        self.max_attempts = max_attempts
+        self.removals = 0
+        max_depth = None if max_depth_factor is None else max_depth_factor * math.log2(len(self.segments) + 1)
+        best = None
+        while True:
+            self.build_attempts += 1
+            for i in range(len(self.segments)):
+                intersected_trapezoids = self.follow_segment(self.segments[i])
+                self.update_map(intersected_trapezoids, self.segments[i])
+
+            if max_depth is None:
+                break
+            depth = self.tree.depth()
+            if best is None or depth < best[0]:
+                best = (depth, self.tree, self.rect_bound, self.segments[:])
+            if depth <= max_depth or self.build_attempts >= max_attempts:
+                break
+
+            self.random.shuffle(self.segments)
+            self.__reset()
+
+        if best is not None and best[1] is not self.tree:
+            _, self.tree, self.rect_bound, self.segments = best
+            self.__redraw(self.tree.get_trapezoids())
+        if self.build_attempts > 1:
+            TrapezoidalMap.__index_segments(self.segments)
+        if self.tree.cache is not None:
+            self.tree.cache.clear()
 
         return self.tree
 
+    def rebuild(self) -> DTree:
+        self.random.shuffle(self.segments)
+        TrapezoidalMap.__index_segments(self.segments)
+        return self.build_trapezoidal_map(self.max_depth_factor, self.max_attempts)
+
+    def __reset(self):
+        self.rect_bound = self.__create_rect_bound()
+        tree = DTree()
+        tree.root = Node.leaf(self.rect_bound)
+        tree.profiler = self.tree.profiler
+        tree.cache = self.tree.cache
+        self.tree = tree
+        self.__redraw([self.rect_bound])
+
+    def __redraw(self, trapezoids: list[Trapezoid]):
+        if self.__vis is None:
+            return
+        for handle in self.get_remove_handle.values():
+            self.__vis.remove_figure(handle)
+        self.get_remove_handle = {trapezoid: self.__vis.add_line_segment(trapezoid.get_segments(as_tuples=True))
+                                  for trapezoid in trapezoids}
+
+    def insert_segment(self, p: tuple[float, float], q: tuple[float, float], above: int = None,
+                       below: int = None) -> Segment:
+        s = Segment(Point(p[0], p[1]), Point(q[0], q[1]), above, below)
+        if s.left == s.right:
+            raise ValueError(f"segment {s} has zero length")
+        min_x, min_y, max_x, max_y = self.bbox
+        for point in s.get_points():
+            if not (min_x < point.x < max_x and min_y < point.y < max_y):
+                raise ValueError(f"segment {s} does not fit in the bounding box of the map")
+        if self.__find_segment(s) is not None:
+            raise ValueError(f"segment {s} is already in the map")
+
+        intersected_trapezoids = self.follow_segment(s)
+        self.update_map(intersected_trapezoids, s)
+        s.index = len(self.segments)
+        self.segments.append(s)
+        self.trapezoids = None
+        self.compiled = None
+        if self.tree.cache is not None:
+            self.tree.cache.clear()
+
+        return s
+
+    def remove_segment(self, p: tuple[float, float], q: tuple[float, float]) -> Segment:
+        target = Segment(Point(p[0], p[1]), Point(q[0], q[1]))
+        s = self.__find_segment(target)
+        if s is None:
+            raise ValueError(f"segment {target} is not in the map")
+
+        tops = self.__follow_side(s, True)
+        bottoms = self.__follow_side(s, False)
+        removed = tops + bottoms
+        start, end = s.get_points()
+
+        left = tops[0].top_left
+        if left is not None and left is bottoms[0].bottom_left and left.up is tops[0].up and left.down is bottoms[0].down:
+            start = left.left
+            removed.append(left)
+
+        right = tops[-1].top_right
+        if right is not None and right is bottoms[-1].bottom_right and right.up is tops[-1].up and \
+                right.down is bottoms[-1].down:
+            end = right.right
+            removed.append(right)
+
+        merged = TrapezoidalMap.__merge_along(tops, bottoms, start, end)
+        TrapezoidalMap.__connect_merged(merged, removed)
+        TrapezoidalMap.__replace_leaves(merged, removed)
+        for trapezoid in removed:
+            self.tree.collapse(*TrapezoidalMap.__inner_point(trapezoid))
+
+        if self.update_visualizer:
+            for trapezoid in removed:
+                if trapezoid in self.get_remove_handle:
+                    self.vis.remove_figure(self.get_remove_handle.pop(trapezoid))
+            for trapezoid in merged:
+                self.get_remove_handle[trapezoid] = self.vis.add_line_segment(trapezoid.get_segments(as_tuples=True))
+
+        last = self.segments.pop()
+        if last is not s:
+            self.segments[s.index] = last
+            last.index = s.index
+        s.index = None
+        self.trapezoids = None
+        self.compiled = None
+        if self.tree.cache is not None:
+            self.tree.cache.clear()
+
+        self.removals += 1
+        if self.rebuild_threshold is not None and self.build_attempts and \
+                self.removals > self.rebuild_threshold * len(self.segments):
+            self.rebuild()
+
+        return s
+
+    def get_trapezoids(self) -> list[Trapezoid]:
+        if self.trapezoids is None:
+            self.trapezoids = self.tree.get_trapezoids()
+            for i, trapezoid in enumerate(self.trapezoids):
+                trapezoid.id = i
+                trapezoid.region = trapezoid.get_region()
+
+        return self.trapezoids
+
+    def stats(self) -> dict:
+        result = self.tree.stats()
+        result['segments'] = len(self.segments)
+        result['trapezoids'] = result['leaves']
+        result['build_attempts'] = self.build_attempts
+        result['removals'] = self.removals
+        if self.compiled is not None:
+            result['compiled_bytes'] = sum(getattr(self.compiled, name).nbytes for name in CompiledTree.FIELDS)
+
+        return result
+
+    def set_profiler(self, profiler: QueryProfiler = None):
+        self.tree.profiler = profiler
+        if self.compiled is not None:
+            self.compiled.profiler = profiler
+
+    def set_cache(self, cache: QueryCache = None):
+        if cache is not None:
+            cache.clear()
+        self.tree.cache = cache
+
+    def compile(self) -> CompiledTree:
+        if self.compiled is None:
+            self.compiled = CompiledTree.from_tree(self.tree, self.get_trapezoids(), self.bbox)
+            self.compiled.profiler = self.tree.profiler
+
+        return self.compiled
+
+    def save(self, path: str):
+        self.compile().save(path)
+
+    def locate_many(self, points) -> np.ndarray:
+        if self.compiled is not None:
+            return self.compiled.locate_many(points)
+
+        self.get_trapezoids()
+        if hasattr(points, 'tolist'):
+            points = points.tolist()
+
+        locate = self.tree.locate
+        min_x, min_y, max_x, max_y = self.bbox
+        return np.fromiter((locate(x, y).id if min_x <= x <= max_x and min_y <= y <= max_y else TrapezoidalMap.OUTSIDE
+                            for x, y in points), dtype=np.int64, count=len(points))
+
+    def contains(self, point: tuple[float, float]) -> bool:
+        min_x, min_y, max_x, max_y = self.bbox
+        return min_x <= point[0] <= max_x and min_y <= point[1] <= max_y
+
+    def locate(self, point: tuple[float, float]) -> (Trapezoid, None):
+        if not self.contains(point):
+            return None
+        self.get_trapezoids()
+        return self.tree.locate(point[0], point[1])
+
+    def locate_region(self, point: tuple[float, float]) -> (int, None):
+        trapezoid = self.locate(point)
+        return None if trapezoid is None else trapezoid.region
+
+    def locate_regions(self, points) -> np.ndarray:
+        return self.compile().locate_regions(points)
+
     def follow_segment(self, s: Segment):
         p, q = s.get_points()
         intersected_trapezoids = []
-        first_trapezoid = self.tree.find(self.tree.root, p, None, s.a).node.trapezoid
+        first_trapezoid = DTree.descend(self.tree.root, p.x, p.y, q).data
         intersected_trapezoids.append(first_trapezoid)
 
         j = 0
@@ -49,7 +277,7 @@ class TrapezoidalMap:
         lower_segment = trapezoid.down
         left = None
 
-        if trapezoid.left.x < p.x - Segment.eps:
+        if trapezoid.left < p:
             left = Trapezoid(trapezoid.left, p, upper_segment, lower_segment)
             if top_left is not None:
                 left.connect_to_top_left(top_left)
@@ -71,7 +299,7 @@ class TrapezoidalMap:
         lower_segment = trapezoid.down
         right = None
 
-        if trapezoid.right.x > q.x + Segment.eps:
+        if q < trapezoid.right:
             right = Trapezoid(q, trapezoid.right, upper_segment, lower_segment)
             right.connect_to_top_right(top_right)
             right.connect_to_bottom_right(bottom_right)
@@ -214,13 +442,12 @@ class TrapezoidalMap:
             if self.update_visualizer:
                 self.__update_visualizer([left, top, bottom, right], s, dict_to_visualize)
 
-            trapezoids[0].node = Node(Leaf(trapezoids[0]))
-            top.node = Node(Leaf(top))
-            bottom.node = Node(Leaf(bottom))
+            Node.leaf(top)
+            Node.leaf(bottom)
             if left:
-                left.node = Node(Leaf(left))
+                Node.leaf(left)
             if right:
-                right.node = Node(Leaf(right))
+                Node.leaf(right)
             self.tree.update_single(trapezoids[0], s, top, bottom, left, right)
         else:
             tops = []
@@ -262,24 +489,19 @@ class TrapezoidalMap:
                 for trapezoid in from_trapezoid[top]:
                     split_trapezoids[trapezoid] = [top]
                     if top.node is None:
-                        top.node = Node(Leaf(top))
+                        Node.leaf(top)
 
             for bot in bottoms:
                 for trapezoid in from_trapezoid[bot]:
                     split_trapezoids[trapezoid].append(bot)
                     if bot.node is None:
-                        bot.node = Node(Leaf(bot))
+                        Node.leaf(bot)
 
             if left:
-                left.node = Node(Leaf(left))
+                Node.leaf(left)
             if right:
-                right.node = Node(Leaf(right))
-
+                Node.leaf(right)
 
-            if left:
-                left.node = Node(Leaf(left))
-            if right:
-                right.node = Node(Leaf(right))
 
             if self.update_visualizer:
                 self.__update_visualizer([left] + tops + bottoms + [right], s, from_trapezoid)
@@ -288,26 +510,180 @@ class TrapezoidalMap:
             self.tree.update_multiple(trapezoids[1:-1], s, split_trapezoids)
             self.tree.update_single(trapezoids[-1], s, split_trapezoids[trapezoids[-1]][0], split_trapezoids[trapezoids[-1]][1], None, right)
 
-    @staticmethod
-    def __create_segments(permuted_s: list[tuple[tuple, tuple]]) -> list[Segment]:
-        result = []
-        for line in permuted_s:
-            start = Point(line[0][0], line[0][1])
-            end = Point(line[1][0], line[1][1])
-            result.append(Segment(start, end))
+    def __find_segment(self, target: Segment) -> (Segment, None):
+        trapezoid = DTree.descend(self.tree.root, target.left.x, target.left.y, target.right).data
+        for segment in (trapezoid.up, trapezoid.down):
+            if segment == target:
+                return segment
+
+        return None
+
+    def __follow_side(self, s: Segment, above: bool) -> list[Trapezoid]:
+        trapezoid = self.tree.find_adjacent(s, above)
+        result = [trapezoid]
+        while trapezoid.right < s.right:
+            top_right = trapezoid.top_right
+            if top_right is not None and (top_right.down if above else top_right.up) is s:
+                trapezoid = top_right
+            else:
+                trapezoid = trapezoid.bottom_right
+            result.append(trapezoid)
+
         return result
 
-    def __create_rect_bound(self) -> Trapezoid:
-        min_x = min(self.segments, key=lambda x: x.left.x).left.x
-        max_x = max(self.segments, key=lambda x: x.right.x).right.x
+    @staticmethod
+    def __merge_along(tops: list[Trapezoid], bottoms: list[Trapezoid], start: Point, end: Point) -> list[Trapezoid]:
+        merged = []
+        left_point = start
+        i = j = 0
+        while i < len(tops) - 1 or j < len(bottoms) - 1:
+            top = tops[i]
+            bottom = bottoms[j]
+            if j == len(bottoms) - 1 or (i < len(tops) - 1 and top.right < bottom.right):
+                right_point = top.right
+                i += 1
+            elif i == len(tops) - 1 or bottom.right < top.right:
+                right_point = bottom.right
+                j += 1
+            else:
+                right_point = top.right
+                i += 1
+                j += 1
+            merged.append(Trapezoid(left_point, right_point, top.up, bottom.down))
+            left_point = right_point
+
+        merged.append(Trapezoid(left_point, end, tops[-1].up, bottoms[-1].down))
+        return merged
+
+    @staticmethod
+    def __connect_merged(merged: list[Trapezoid], removed: list[Trapezoid]):
+        removed_ids = {id(trapezoid) for trapezoid in removed}
+        by_left = {trapezoid.left.to_tuple(): trapezoid for trapezoid in merged}
+        by_right = {trapezoid.right.to_tuple(): trapezoid for trapezoid in merged}
+
+        for trapezoid, next_trapezoid in zip(merged, merged[1:]):
+            wall = next_trapezoid.left
+            if trapezoid.up.position(wall) == Position.BELOW and next_trapezoid.up.position(wall) == Position.BELOW:
+                trapezoid.connect_to_top_right(next_trapezoid)
+            else:
+                trapezoid.connect_to_bottom_right(next_trapezoid)
+
+        for old in removed:
+            new = by_left.get(old.left.to_tuple())
+            for neighbour in (old.top_left, old.bottom_left):
+                if new is None or neighbour is None or id(neighbour) in removed_ids:
+                    continue
+                if neighbour.up.position(new.left) == Position.BELOW and new.up.position(new.left) == Position.BELOW:
+                    new.top_left = neighbour
+                else:
+                    new.bottom_left = neighbour
+                if id(neighbour.top_right) in removed_ids:
+                    neighbour.top_right = new
+                if id(neighbour.bottom_right) in removed_ids:
+                    neighbour.bottom_right = new
+
+            new = by_right.get(old.right.to_tuple())
+            for neighbour in (old.top_right, old.bottom_right):
+                if new is None or neighbour is None or id(neighbour) in removed_ids:
+                    continue
+                if neighbour.up.position(new.right) == Position.BELOW and new.up.position(new.right) == Position.BELOW:
+                    new.top_right = neighbour
+                else:
+                    new.bottom_right = neighbour
+                if id(neighbour.top_left) in removed_ids:
+                    neighbour.top_left = new
+                if id(neighbour.bottom_left) in removed_ids:
+                    neighbour.bottom_left = new
+
+    @staticmethod
+    def __search_by_x(trapezoids: list[Trapezoid]) -> Node:
+        if len(trapezoids) == 1:
+            return trapezoids[0].node
+
+        mid = len(trapezoids) // 2
+        return Node(X_NODE, trapezoids[mid].left, TrapezoidalMap.__search_by_x(trapezoids[:mid]),
+                    TrapezoidalMap.__search_by_x(trapezoids[mid:]))
 
-        min_y_start = min(self.segments, key=lambda y: y.left.y).left.y
-        min_y_end = min(self.segments, key=lambda y: y.right.y).right.y
-        max_y_start = max(self.segments, key=lambda y: y.left.y).left.y
-        max_y_end = max(self.segments, key=lambda y: y.right.y).right.y
+    @staticmethod
+    def __inner_point(trapezoid: Trapezoid) -> (float, float):
+        left = trapezoid.left
+        right = trapezoid.right
+        if left.x == right.x:
+            return left.x, (left.y + right.y) / 2
+        x = (left.x + right.x) / 2
+        return x, (trapezoid.up.get_y_from_x(x) + trapezoid.down.get_y_from_x(x)) / 2
+
+    @staticmethod
+    def __replace_leaves(merged: list[Trapezoid], removed: list[Trapezoid]):
+        for old in removed:
+            covering = [t for t in merged if t.left < old.right and old.left < t.right]
+            if not covering:
+                covering = [t for t in merged if not old.left < t.left][-1:]
+
+            node = old.node
+            if len(covering) == 1 and covering[0].node is None:
+                node.set(LEAF, covering[0], None, None)
+                covering[0].node = node
+                continue
+
+            for trapezoid in covering:
+                if trapezoid.node is None:
+                    Node.leaf(trapezoid)
+            if len(covering) == 1:
+                node.set(X_NODE, covering[0].left, covering[0].node, covering[0].node)
+            else:
+                root = TrapezoidalMap.__search_by_x(covering)
+                node.set(root.kind, root.data, root.left, root.right)
+
+    @staticmethod
+    def __create_segments(s, labels: list[tuple] = None, rng: random.Random = None) -> (list[Segment], tuple):
+        s = np.asarray(s, dtype=float).reshape(-1, 2, 2)
+        keep = np.flatnonzero((s[:, 0] != s[:, 1]).any(axis=1))
+        if rng is not None:
+            keep = np.random.default_rng(rng.getrandbits(64)).permutation(keep)
+        s = s[keep]
+        if labels is not None:
+            labels = [labels[i] for i in keep.tolist()]
+        swap = (s[:, 0, 0] > s[:, 1, 0]) | ((s[:, 0, 0] == s[:, 1, 0]) & (s[:, 0, 1] > s[:, 1, 1]))
+        s[swap] = s[swap, ::-1]
+
+        bounds = None
+        if len(s):
+            bounds = (float(s[:, 0, 0].min()), float(s[:, :, 1].min()), float(s[:, 1, 0].max()),
+                      float(s[:, :, 1].max()))
+        coords = s.reshape(-1, 4).tolist()
+        if labels is None:
+            result = [Segment(Point(x1, y1), Point(x2, y2)) for x1, y1, x2, y2 in coords]
+        else:
+            result = [Segment(Point(x1, y1), Point(x2, y2), label[0], label[1])
+                      for (x1, y1, x2, y2), label in zip(coords, labels)]
+        TrapezoidalMap.__index_segments(result)
+        return result, bounds
+
+    @staticmethod
+    def __index_segments(segments: list[Segment]):
+        for i, segment in enumerate(segments):
+            segment.index = i
 
-        min_y = min(min_y_start, min_y_end)
-        max_y = max(max_y_start, max_y_end)
+    @staticmethod
+    def create_bbox(bounds: tuple = None, bbox: tuple = None) -> tuple[float, float, float, float]:
+        if bbox is None:
+            if bounds is None:
+                raise ValueError("a map without segments needs an explicit bounding box")
+            min_x, min_y, max_x, max_y = bounds
+            margin = max(max_x - min_x, max_y - min_y) * 0.01
+            return min_x - margin, min_y - margin, max_x + margin, max_y + margin
+
+        min_x, min_y, max_x, max_y = (float(v) for v in bbox)
+        if not (min_x < max_x and min_y < max_y):
+            raise ValueError(f"bounding box {bbox} is empty")
+        if bounds is not None and not (min_x < bounds[0] and min_y < bounds[1] and bounds[2] < max_x and
+                                       bounds[3] < max_y):
+            raise ValueError(f"segments do not fit strictly inside the bounding box {bbox}")
+        return min_x, min_y, max_x, max_y
+
+    def __create_rect_bound(self) -> Trapezoid:
+        min_x, min_y, max_x, max_y = self.bbox
 
         topSegment = Segment(Point(min_x, max_y), Point(max_x, max_y))
         bottomSegment = Segment(Point(min_x, min_y), Point(max_x, min_y))
@@ -1,32 +1,161 @@
+import numpy as np
+
+
 def generateParallelSegments(maxX, maxY, n):
     delta_x = maxX / (2 * n + 2)
     delta_y = maxY / n
-    y = maxY
-    x_max = maxX
-    x_min = 0
-    segments = []
-
-    for _ in range(n):
-        y -= delta_y
-        x_max -= delta_x
-        x_min += delta_x
-        segments.append(((x_min, y), (x_max, y)))
+    steps = np.arange(1, n + 1)
+    y = maxY - steps * delta_y
+    start = np.stack((steps * delta_x, y), axis=1)
+    end = np.stack((maxX - steps * delta_x, y), axis=1)
 
-    return segments
+    return np.stack((start, end), axis=1).tolist()
 
 
 def calculateDSize(node, count, visited):
-    if node is None or node in visited:
-        return
-    count[0] += 1
-    visited.add(node)
-    calculateDSize(node.left, count, visited)
-    calculateDSize(node.right, count, visited)
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node is None or node in visited:
+            continue
+        count[0] += 1
+        visited.add(node)
+        stack.append(node.right)
+        stack.append(node.left)
 
 
 def generateUniformPoints(maxX, maxY, n):
     x_coord = np.random.uniform(1, maxX, n)
     y_coord = np.random.uniform(1, maxY, n)
 
-    res = [(x, y) for x, y in zip(x_coord, y_coord)]
-    return res
\ No newline at end of file
+    return np.stack((x_coord, y_coord), axis=1).tolist()
+
+
+def generateClusteredPoints(maxX, maxY, n, clusters=10, spread=0.05):
+    centers = np.random.uniform(0, 1, (clusters, 2)) * (maxX, maxY)
+    points = centers[np.random.randint(0, clusters, n)] + np.random.normal(0, spread, (n, 2)) * (maxX, maxY)
+
+    return np.clip(points, 0, (maxX, maxY)).tolist()
+
+
+def generateSkewedPoints(maxX, maxY, n, exponent=3.0):
+    points = np.random.uniform(0, 1, (n, 2)) ** exponent * (maxX, maxY)
+
+    return points.tolist()
+
+
+def generateRandomSegments(maxX, maxY, n):
+    rows = max(1, int(np.sqrt(n)))
+    per_row = -(-n // rows)
+    row_height = maxY / rows
+    x = np.sort(np.random.uniform(0, maxX, (rows, 2 * per_row)), axis=1).reshape(-1, 2)
+    y = (np.repeat(np.arange(rows), per_row)[:, None] + np.random.uniform(0.05, 0.95, (rows * per_row, 2))) * row_height
+    segments = np.stack((x, y), axis=2)
+
+    return segments[np.random.permutation(len(segments))[:n]].tolist()
+
+
+def generateNearVerticalSegments(maxX, maxY, n):
+    delta_x = maxX / (n + 1)
+    x = np.arange(1, n + 1) * delta_x
+    y_min = np.random.uniform(0, maxY / 2, n)
+    y_max = np.random.uniform(maxY / 2, maxY, n)
+    start = np.stack((x, y_min), axis=1)
+    end = np.stack((x + delta_x / 4, y_max), axis=1)
+
+    return np.stack((start, end), axis=1).tolist()
+
+
+def _jitteredGrid(maxX, maxY, k):
+    cell_x = maxX / (k + 1)
+    cell_y = maxY / (k + 1)
+    i, j = np.meshgrid(np.arange(k + 1) + 0.5, np.arange(k + 1) + 0.5, indexing='ij')
+    vertices = np.stack((i * cell_x, j * cell_y), axis=2)
+    vertices += np.random.uniform(-0.2, 0.2, vertices.shape) * (cell_x, cell_y)
+
+    return vertices
+
+
+def _meshResult(vertices, edges, left, right, labels):
+    p = vertices[edges[:, 0, 0], edges[:, 0, 1]]
+    q = vertices[edges[:, 1, 0], edges[:, 1, 1]]
+    segments = np.stack((p, q), axis=1).tolist()
+    if not labels:
+        return segments
+
+    forward = p[:, 0] < q[:, 0]
+    above = np.where(forward, left, right).tolist()
+    below = np.where(forward, right, left).tolist()
+    return segments, [(None if a < 0 else a, None if b < 0 else b) for a, b in zip(above, below)]
+
+
+def _gridEdges(k):
+    i, j = np.meshgrid(np.arange(k + 1), np.arange(k + 1), indexing='ij')
+    horizontal = np.stack((np.stack((i[:-1], j[:-1]), axis=2), np.stack((i[1:], j[1:]), axis=2)), axis=2)
+    vertical = np.stack((np.stack((i[:, :-1], j[:, :-1]), axis=2), np.stack((i[:, 1:], j[:, 1:]), axis=2)), axis=2)
+
+    return horizontal.reshape(-1, 2, 2), vertical.reshape(-1, 2, 2)
+
+
+def generateGridMesh(maxX, maxY, n, labels=False):
+    k = max(1, int(np.sqrt(n / 2)))
+    vertices = _jitteredGrid(maxX, maxY, k)
+    horizontal, vertical = _gridEdges(k)
+
+    def cell(i, j):
+        return np.where((i >= 0) & (i < k) & (j >= 0) & (j < k), i * k + j, -1)
+
+    hi, hj = horizontal[:, 0, 0], horizontal[:, 0, 1]
+    vi, vj = vertical[:, 0, 0], vertical[:, 0, 1]
+    left = np.concatenate((cell(hi, hj), cell(vi - 1, vj)))
+    right = np.concatenate((cell(hi, hj - 1), cell(vi, vj)))
+
+    return _meshResult(vertices, np.concatenate((horizontal, vertical)), left, right, labels)
+
+
+def generateTriangleMesh(maxX, maxY, n, labels=False):
+    k = max(1, int(np.sqrt(n / 3)))
+    vertices = _jitteredGrid(maxX, maxY, k)
+    horizontal, vertical = _gridEdges(k)
+    flipped = np.random.randint(0, 2, (k, k))
+
+    def triangle(i, j, upper):
+        valid = (i >= 0) & (i < k) & (j >= 0) & (j < k)
+        return np.where(valid, 2 * (np.clip(i, 0, k - 1) * k + np.clip(j, 0, k - 1)) + upper, -1)
+
+    def flip(i, j):
+        return flipped[np.clip(i, 0, k - 1), np.clip(j, 0, k - 1)]
+
+    ci, cj = np.meshgrid(np.arange(k), np.arange(k), indexing='ij')
+    ci, cj = ci.ravel(), cj.ravel()
+    f = flipped.ravel()
+    diagonal = np.stack((np.stack((ci, cj + f), axis=1), np.stack((ci + 1, cj + 1 - f), axis=1)), axis=1)
+
+    hi, hj = horizontal[:, 0, 0], horizontal[:, 0, 1]
+    vi, vj = vertical[:, 0, 0], vertical[:, 0, 1]
+    left = np.concatenate((triangle(hi, hj, 0), triangle(vi - 1, vj, flip(vi - 1, vj)), triangle(ci, cj, 1)))
+    right = np.concatenate((triangle(hi, hj - 1, 1), triangle(vi, vj, 1 - flip(vi, vj)), triangle(ci, cj, 0)))
+
+    return _meshResult(vertices, np.concatenate((horizontal, vertical, diagonal)), left, right, labels)
+
+
+def generateHexMesh(maxX, maxY, n, labels=False):
+    k = max(2, int(np.sqrt(n / 1.5)))
+    vertices = _jitteredGrid(maxX, maxY, k)
+    horizontal, vertical = _gridEdges(k)
+    vi, vj = vertical[:, 0, 0], vertical[:, 0, 1]
+    vertical = vertical[((vi + vj) % 2 == 0) | (vi == 0) | (vi == k)]
+
+    def face(i, j):
+        start = np.maximum(i - (i - j) % 2, 0)
+        return np.where((i >= 0) & (i < k) & (j >= 0) & (j < k), j * (k + 1) + start, -1)
+
+    hi, hj = horizontal[:, 0, 0], horizontal[:, 0, 1]
+    vi, vj = vertical[:, 0, 0], vertical[:, 0, 1]
+    left = np.concatenate((face(hi, hj), face(vi - 1, vj)))
+    right = np.concatenate((face(hi, hj - 1), face(vi, vj)))
+    ids, faces = np.unique(np.concatenate((left, right)), return_inverse=True)
+    faces = faces.reshape(-1) - (ids[0] < 0)
+    left, right = faces[:len(left)], faces[len(left):]
+
+    return _meshResult(vertices, np.concatenate((horizontal, vertical)), left, right, labels)
@@ -0,0 +1,97 @@
+from array import array
+import numpy as np
+from .figures.point import Point
+from .figures.line_segment import LineSegment
+from .figures.circle import Circle
+from .figures.polygon import Polygon
+from .figures.line import Line
+from .figures.half_line import HalfLine
+
+
+class EventLog:
+    ADD = 0
+    REMOVE = 1
+    FIGURES = (Point, LineSegment, Circle, Polygon, Line, HalfLine)
+    KINDS = {figure: kind for kind, figure in enumerate(FIGURES)}
+    ARRAYS = ('ops', 'ids', 'kinds', 'styles', 'ends', 'coords')
+
+    def __init__(self):
+        self.ops = array('b')
+        self.ids = array('i')
+        self.kinds = array('b')
+        self.styles = array('i')
+        self.ends = array('q')
+        self.coords = array('d')
+        self.options = []
+        self.figures = 0
+        self.__style_index = {}
+
+    def __len__(self):
+        return len(self.ops)
+
+    @staticmethod
+    def __style_key(options):
+        try:
+            key = tuple(options.items())
+            hash(key)
+        except TypeError:
+            key = repr(sorted(options.items()))
+        return key
+
+    def add(self, figure, data, options):
+        key = EventLog.__style_key(options)
+        style = self.__style_index.get(key)
+        if style is None:
+            style = self.__style_index[key] = len(self.options)
+            self.options.append(options)
+
+        self.coords.frombytes(figure.pack(data).tobytes())
+        self.ops.append(EventLog.ADD)
+        self.ids.append(self.figures)
+        self.kinds.append(EventLog.KINDS[figure])
+        self.styles.append(style)
+        self.ends.append(len(self.coords))
+        self.figures += 1
+        return self.figures - 1
+
+    def remove(self, figure_id):
+        self.ops.append(EventLog.REMOVE)
+        self.ids.append(figure_id)
+        self.kinds.append(-1)
+        self.styles.append(-1)
+        self.ends.append(len(self.coords))
+
+    def figure(self, event):
+        start = self.ends[event - 1] if event else 0
+        flat = np.array(self.coords[start:self.ends[event]], dtype=np.float64)
+        return EventLog.FIGURES[self.kinds[event]].unpack(flat, self.options[self.styles[event]])
+
+    def events(self):
+        for event in range(len(self.ops)):
+            if self.ops[event] == EventLog.ADD:
+                yield EventLog.ADD, self.ids[event], self.figure(event)
+            else:
+                yield EventLog.REMOVE, self.ids[event], None
+
+    def visible(self):
+        added = {}
+        for event in range(len(self.ops)):
+            if self.ops[event] == EventLog.ADD:
+                added[self.ids[event]] = event
+            else:
+                added.pop(self.ids[event], None)
+        return [self.figure(event) for event in added.values()]
+
+    def to_arrays(self):
+        return {name: np.array(getattr(self, name), dtype=getattr(self, name).typecode) for name in EventLog.ARRAYS}
+
+    @staticmethod
+    def from_arrays(arrays, options):
+        log = EventLog()
+        for name in EventLog.ARRAYS:
+            getattr(log, name).frombytes(np.ascontiguousarray(arrays[name], dtype=getattr(log, name).typecode)
+                                         .tobytes())
+        log.options = list(options)
+        log.figures = int(np.count_nonzero(np.asarray(arrays['ops']) == EventLog.ADD))
+        log.__style_index = {EventLog.__style_key(style): i for i, style in enumerate(log.options)}
+        return log
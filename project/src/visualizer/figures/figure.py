@@ -1,6 +1,15 @@
+import numpy as np
+
+
 class Figure:
     def __init__(self, data, options):
         self.data = data
         self.options = options
-        self.artist = None
-        self.to_be_removed = False
+
+    @classmethod
+    def pack(cls, data):
+        return np.asarray(data, dtype=np.float64).ravel()
+
+    @classmethod
+    def unpack(cls, flat, options):
+        return cls(flat, options)
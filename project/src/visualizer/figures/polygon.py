@@ -18,6 +18,20 @@ class Polygon(Figure):
             data = np.array(data).reshape(1, -1, 2)
         super().__init__(data, options)
 
+    @classmethod
+    def pack(cls, data):
+        polygons = cls(data, {}).data
+        sizes = [len(polygon) for polygon in polygons]
+        return np.concatenate([np.array([len(sizes)] + sizes, dtype=np.float64)] +
+                              [np.asarray(polygon, dtype=np.float64).ravel() for polygon in polygons])
+
+    @classmethod
+    def unpack(cls, flat, options):
+        count = int(flat[0])
+        ends = np.cumsum(flat[1:count + 1].astype(np.int64) * 2) + count + 1
+        starts = np.concatenate(([count + 1], ends[:-1]))
+        return cls([flat[start:end].reshape(-1, 2) for start, end in zip(starts, ends)], options)
+
     def draw(self, ax):
         artist = []
         for polygon in self.data:
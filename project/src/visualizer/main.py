@@ -1,15 +1,18 @@
+import json
+import numpy as np
 from .figures.point import Point
 from .figures.line_segment import LineSegment
 from .figures.circle import Circle
 from .figures.polygon import Polygon
 from .figures.line import Line
 from .figures.half_line import HalfLine
+from .event_log import EventLog
 from .plot.plot import Plot
 
 
 class Visualizer:
     def __init__(self):
-        self.data = []
+        self.log = EventLog()
         self.plot_data = {}
 
     def add_title(self, title):
@@ -22,52 +25,57 @@ class Visualizer:
         self.plot_data['axis_equal'] = True
 
     def add_point(self, data, **kwargs):
-        point = Point(data, kwargs)
-        self.data.append(point)
-        return point
+        return self.log.add(Point, data, kwargs)
 
     def add_line_segment(self, data, **kwargs):
-        line_segment = LineSegment(data, kwargs)
-        self.data.append(line_segment)
-        return line_segment
+        return self.log.add(LineSegment, data, kwargs)
 
     def add_circle(self, data, **kwargs):
-        circle = Circle(data, kwargs)
-        self.data.append(circle)
-        return circle
+        return self.log.add(Circle, data, kwargs)
 
     def add_polygon(self, data, **kwargs):
-        polygon = Polygon(data, kwargs)
-        self.data.append(polygon)
-        return polygon
+        return self.log.add(Polygon, data, kwargs)
 
     def add_line(self, data, **kwargs):
-        line = Line(data, kwargs)
-        self.data.append(line)
-        return line
+        return self.log.add(Line, data, kwargs)
 
     def add_half_line(self, data, **kwargs):
-        semi_line = HalfLine(data, kwargs)
-        self.data.append(semi_line)
-        return semi_line
+        return self.log.add(HalfLine, data, kwargs)
 
     def remove_figure(self, figure):
-        figure.to_be_removed = True
-        self.data.append(figure)
+        self.log.remove(figure)
 
     def clear(self):
-        self.data = []
+        self.log = EventLog()
         self.plot_data = {}
 
+    def save_log(self, filename='trace'):
+        np.savez_compressed(f'{filename}.npz', **self.log.to_arrays(),
+                            options=json.dumps(self.log.options), plot_data=json.dumps(self.plot_data))
+
+    @staticmethod
+    def load_log(filename):
+        with np.load(filename if filename.endswith('.npz') else f'{filename}.npz') as arrays:
+            vis = Visualizer()
+            vis.log = EventLog.from_arrays(arrays, json.loads(str(arrays['options'])))
+            vis.plot_data = json.loads(str(arrays['plot_data']))
+        return vis
+
     def show(self):
-        Plot.show(self.plot_data, self.data)
+        Plot.show(self.plot_data, self.log)
 
     def save(self, filename='plot'):
-        Plot.save(self.plot_data, self.data, filename)
+        Plot.save(self.plot_data, self.log, filename)
 
-    def show_gif(self, interval=256):
-        gif = Plot.show_gif(self.plot_data, self.data, interval)
+    def show_gif(self, interval=256, step=1):
+        gif = Plot.show_gif(self.plot_data, self.log, interval, step)
         return gif
 
-    def save_gif(self, filename='animation', interval=256):
-        Plot.save_gif(self.plot_data, self.data, interval, filename)
+    def save_gif(self, filename='animation', interval=256, step=1):
+        Plot.save_gif(self.plot_data, self.log, interval, filename, step)
+
+    def save_mp4(self, filename='animation', interval=256, step=1):
+        Plot.save_mp4(self.plot_data, self.log, interval, filename, step)
+
+    def save_frames(self, filename='frame', step=1):
+        Plot.save_frames(self.plot_data, self.log, filename, step)
@@ -1,12 +1,16 @@
 import matplotlib.pyplot as plt
-import matplotlib.animation as animation
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from IPython.display import Image
+from .writers import GifWriter, Mp4Writer, PngWriter
+from ..event_log import EventLog
 import os
+import tempfile
 
 
 class Plot:
     @staticmethod
-    def __build_plot(plot_data, data):
+    def __build_plot(plot_data, log):
         fig, ax = plt.subplots()
         ax.set_xlabel('x')
         ax.set_ylabel('y')
@@ -16,9 +20,8 @@ class Plot:
         if 'grid' in plot_data:
             ax.grid()
 
-        for figure in data:
-            if not figure.to_be_removed:
-                figure.draw(ax)
+        for figure in log.visible():
+            figure.draw(ax)
 
         if 'axis_equal' in plot_data:
             ax.axis('equal')
@@ -28,58 +31,75 @@ class Plot:
         return fig, ax
 
     @staticmethod
-    def __build_gif(plot_data, data, interval):
-        fig, ax = plt.subplots()
-        artists = []
-        frames = [ax.set_xlabel('x'), ax.set_ylabel('y')]
-        artists.append(frames[:])
+    def __stream(plot_data, log, step=1):
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        ax.set_xlabel('x')
+        ax.set_ylabel('y')
 
         if 'title' in plot_data:
             ax.set_title(plot_data['title'])
         if 'grid' in plot_data:
             ax.grid()
 
-        for figure in data:
-            if figure.to_be_removed and figure.artist:
-                first = frames.index(figure.artist[0])
-                last = frames.index(figure.artist[-1])
-                figure.artist = None
-                frames = frames[:first] + frames[last+1:]
-            else:
-                artist = figure.draw(ax)
-                figure.artist = artist
-                frames.extend(artist)
-            artists.append(frames[:])
-                
+        for op, _, figure in log.events():
+            if op == EventLog.ADD:
+                for artist in figure.draw(ax):
+                    artist.remove()
+
         if 'axis_equal' in plot_data:
             ax.axis('equal')
         else:
             ax.autoscale()
-            
-        return animation.ArtistAnimation(fig=fig, artists=artists, interval=interval, blit=True)
+        ax.set_autoscale_on(False)
+
+        artists = {}
+        yield fig
+        for i, (op, figure_id, figure) in enumerate(log.events(), 1):
+            if op == EventLog.ADD:
+                artists[figure_id] = figure.draw(ax)
+            elif figure_id in artists:
+                for artist in artists.pop(figure_id):
+                    artist.remove()
+            if i % step == 0 or i == len(log):
+                yield fig
+
+    @staticmethod
+    def __write_frames(plot_data, log, writer, step):
+        try:
+            for fig in Plot.__stream(plot_data, log, step):
+                writer.write(fig)
+        finally:
+            writer.close()
 
     @staticmethod
-    def show(plot_data, data):
-        fig, _ = Plot.__build_plot(plot_data, data)
+    def show(plot_data, log):
+        fig, _ = Plot.__build_plot(plot_data, log)
         fig.show(warn=False)
 
     @staticmethod
-    def save(plot_data, data, filename):
-        fig, _ = Plot.__build_plot(plot_data, data)
+    def save(plot_data, log, filename):
+        fig, _ = Plot.__build_plot(plot_data, log)
         fig.savefig(filename)
         plt.close()
 
     @staticmethod
-    def show_gif(plot_data, data, interval):
-        Plot.save_gif(plot_data, data, interval,
-                      f'{__file__}.__tmp_animation_holder__')
-        plt.close()
-        gif = Image(f'{__file__}.__tmp_animation_holder__.gif')
-        os.remove(f'{__file__}.__tmp_animation_holder__.gif')
+    def show_gif(plot_data, log, interval, step=1):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'animation')
+            Plot.save_gif(plot_data, log, interval, filename, step)
+            gif = Image(filename=f'{filename}.gif')
         return gif
 
     @staticmethod
-    def save_gif(plot_data, data, interval, filename):
-        anim = Plot.__build_gif(plot_data, data, interval)
-        anim.save(filename=f'{filename}.gif', writer='pillow')
-        plt.close()
+    def save_gif(plot_data, log, interval, filename, step=1):
+        Plot.__write_frames(plot_data, log, GifWriter(f'{filename}.gif', interval), step)
+
+    @staticmethod
+    def save_mp4(plot_data, log, interval, filename, step=1):
+        Plot.__write_frames(plot_data, log, Mp4Writer(f'{filename}.mp4', interval), step)
+
+    @staticmethod
+    def save_frames(plot_data, log, filename, step=1):
+        Plot.__write_frames(plot_data, log, PngWriter(filename), step)
@@ -0,0 +1,57 @@
+import matplotlib.animation as animation
+import numpy as np
+from PIL import Image, GifImagePlugin
+
+
+class GifWriter:
+    def __init__(self, filename, interval):
+        self.file = open(filename, 'wb')
+        self.interval = interval
+        self.count = 0
+
+    def write(self, fig):
+        fig.canvas.draw()
+        image = Image.fromarray(np.asarray(fig.canvas.buffer_rgba())).convert('RGB')
+        image = image.convert('P', palette=Image.Palette.ADAPTIVE)
+        if self.count == 0:
+            header, _ = GifImagePlugin.getheader(image, info={'loop': 0, 'duration': self.interval})
+            self.file.write(b''.join(header))
+        for block in GifImagePlugin.getdata(image, duration=self.interval, include_color_table=True):
+            self.file.write(block)
+        self.count += 1
+
+    def close(self):
+        self.file.write(b';')
+        self.file.close()
+
+
+class PngWriter:
+    def __init__(self, filename):
+        self.filename = filename
+        self.count = 0
+
+    def write(self, fig):
+        fig.savefig(f'{self.filename}_{self.count:05d}.png')
+        self.count += 1
+
+    def close(self):
+        pass
+
+
+class Mp4Writer:
+    def __init__(self, filename, interval):
+        if not animation.FFMpegWriter.isAvailable():
+            raise RuntimeError('writing MP4 needs ffmpeg; save a PNG sequence with save_frames instead')
+        self.filename = filename
+        self.writer = animation.FFMpegWriter(fps=1000 / interval)
+        self.count = 0
+
+    def write(self, fig):
+        if self.count == 0:
+            self.writer.setup(fig, self.filename)
+        self.writer.grab_frame()
+        self.count += 1
+
+    def close(self):
+        if self.count:
+            self.writer.finish()